@@ -0,0 +1,78 @@
+"""
+Compara el motor vectorizado del dashboard (nucleo_reservas.analitica.calcular_analitica) con la
+implementación anterior de referencia.py, a 10 mil y 1 millón de reservas.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_analitica.py [filas ...]
+"""
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+import referencia
+from datos_sinteticos import generar_reservas
+from nucleo_reservas.analitica import calcular_analitica
+from nucleo_reservas.config import obtener_hora_local
+from reservas2 import (crear_grafico_asistentes_criterio, crear_grafico_ocupacion_semanal, crear_grafico_prioridades,
+                       crear_grafico_tendencia_mensual, crear_mapa_calor_horarios)
+
+FILAS_POR_DEFECTO = [10_000, 1_000_000]
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, min(tiempos)
+
+def dashboard_referencia(reservas):
+    metricas = referencia.calcular_metricas(reservas)
+    return {
+        'metricas': metricas,
+        'figuras': [referencia.crear_grafico_ocupacion_semanal(reservas), crear_grafico_prioridades(metricas),
+                    referencia.crear_grafico_tendencia_mensual(reservas), referencia.crear_mapa_calor_horarios(reservas)],
+        'asistentes': referencia.asistentes_por_criterio(reservas),
+    }
+
+def dashboard_vectorizado(reservas):
+    analitica = calcular_analitica(reservas)
+    return {
+        'metricas': analitica['metricas'],
+        'figuras': [crear_grafico_ocupacion_semanal(analitica), crear_grafico_prioridades(analitica['metricas']),
+                    crear_grafico_tendencia_mensual(analitica), crear_mapa_calor_horarios(analitica)],
+        'asistentes': crear_grafico_asistentes_criterio(analitica),
+    }
+
+def verificar(reservas, esperado, obtenido):
+    """
+    Mismas métricas y mismos datos en cada gráfico. La tasa de ocupación de referencia.py
+    supone 1,5 horas por reunión; la actual suma la duración de cada reunión del mes.
+    """
+    mes_actual = obtener_hora_local().month
+    minutos_mes = sum(r.duracion for r in reservas if r.dia is not None and date.fromordinal(r.dia).month == mes_actual)
+    metricas = dict(esperado['metricas'], tasa_ocupacion=round(minutos_mes / 60 / (9 * 5 * 4) * 100, 1))
+    assert metricas == obtenido['metricas'], (metricas, obtenido['metricas'])
+    for fig_esperada, fig_obtenida in zip(esperado['figuras'], obtenido['figuras']):
+        assert fig_esperada.to_dict()['data'] == fig_obtenida.to_dict()['data']
+    barras = obtenido['asistentes'].data[0]
+    assert list(barras.x) == esperado['asistentes']['criterio'].tolist()
+    assert np.allclose(barras.y, esperado['asistentes']['num_asistentes'])
+
+def main(filas):
+    print(f"{'filas':>10} {'referencia':>12} {'vectorizado':>12} {'aceleración':>12}")
+    for n in filas:
+        reservas = generar_reservas(n)
+        repeticiones = 5 if n <= 100_000 else 1
+        esperado, t_ref = medir(lambda: dashboard_referencia(reservas), repeticiones)
+        obtenido, t_vec = medir(lambda: dashboard_vectorizado(reservas), repeticiones)
+        verificar(reservas, esperado, obtenido)
+        print(f"{n:>10,} {t_ref * 1000:>10.0f}ms {t_vec * 1000:>10.0f}ms {t_ref / t_vec:>11.1f}x")
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or FILAS_POR_DEFECTO)
@@ -0,0 +1,94 @@
+"""
+Compara la reubicación óptima (modo 'optimo', asignar_optimo) con la búsqueda voraz (modo
+'voraz') en días de una sala con alta ocupación: porcentaje de solicitudes asignadas,
+reuniones movidas, minutos movidos y latencia por solicitud. Verifica además que ninguna
+solución deje reuniones solapadas.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_asignacion.py [casos]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from nucleo_reservas.agenda import procesar_reserva_con_rango_y_prioridad
+from nucleo_reservas.config import CRITERIO_PRIORIDAD, obtener_hora_local, obtener_salas, sala_principal
+from nucleo_reservas.modelo import Reserva, minutes_to_time
+
+from datos_sinteticos import SEMILLA, generar_reservas
+
+CASOS_POR_DEFECTO = 2000
+DIA = next(date.today() + timedelta(days=d) for d in range(7, 14)
+           if (date.today() + timedelta(days=d)).weekday() < 5) # Los datos sintéticos son de lunes a viernes
+FECHA = DIA.isoformat()
+CRITERIOS = list(CRITERIO_PRIORIDAD)
+
+def generar_caso(azar):
+    """
+    Un día de la sala principal con 4 a 8 reuniones sin solaparse (datos_sinteticos) y una
+    solicitud de prioridad alta. Ninguna reunión tiene esa prioridad y la mayoría se pidió
+    hoy, así que se pueden reubicar.
+    """
+    hoy = obtener_hora_local().strftime('%Y-%m-%d %H:%M:%S')
+    antes = (obtener_hora_local() - timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')
+    sala = sala_principal()
+    cantidad = azar.randint(4, 8)
+    reservas = [r for r in generar_reservas(cantidad, azar.randrange(2 ** 32), {sala: obtener_salas()[sala]},
+                                            hasta=DIA, reuniones_por_sala=(cantidad, cantidad))
+                if r['fecha'] == FECHA]
+    for reserva in reservas:
+        reserva['criterio'] = azar.choice(CRITERIOS[1:])
+        reserva['fecha_reserva'] = hoy if azar.random() < 0.7 else antes
+    inicio = azar.randrange(8 * 60, 15 * 60 + 1, 30)
+    nueva = Reserva({
+        'id': 'NUEVA', 'nombre': 'Persona', 'email': 'persona@ejemplo.cl', 'fecha': FECHA,
+        'hora_inicio_rango': minutes_to_time(inicio),
+        'hora_fin_rango': minutes_to_time(min(17 * 60, inicio + azar.choice([90, 120, 180]))),
+        'hora_inicio': '', 'hora_fin': '', 'criterio': CRITERIOS[0], 'num_asistentes': 4,
+        'proposito': 'Reunión', 'fecha_reserva': hoy,
+    })
+    return reservas, nueva, azar.choice([60, 90, 120])
+
+def sin_solapes(reservas):
+    intervalos = sorted((r.inicio, r.fin) for r in reservas if r.fin > r.inicio)
+    return all(fin <= siguiente for (_, fin), (siguiente, _) in zip(intervalos, intervalos[1:]))
+
+def ejecutar(modo, casos):
+    asignadas, movidas, minutos, tiempos, solapadas = 0, [], [], [], 0
+    for reservas, nueva, duracion in casos:
+        originales = {r.id: r.inicio for r in reservas}
+        copia = [r.copy() for r in reservas]
+        inicio = time.perf_counter()
+        exito, resultado, _, reubicadas = procesar_reserva_con_rango_y_prioridad(nueva.copy(), copia, duracion, modo)
+        tiempos.append(time.perf_counter() - inicio)
+        if exito:
+            asignadas += 1
+            movidas.append(len(reubicadas))
+            minutos.append(sum(abs(r.inicio - originales[r.id]) for r in reubicadas))
+            solapadas += not sin_solapes(resultado)
+    return {
+        'asignadas': asignadas / len(casos) * 100,
+        'movidas': statistics.mean(movidas) if movidas else 0,
+        'minutos': statistics.mean(minutos) if minutos else 0,
+        'p50': statistics.median(tiempos) * 1000,
+        'p95': sorted(tiempos)[int(len(tiempos) * 0.95)] * 1000,
+        'solapadas': solapadas,
+    }
+
+def main(n):
+    azar = random.Random(SEMILLA)
+    casos = [generar_caso(azar) for _ in range(n)]
+    print(f"{n} solicitudes de prioridad 1 en días ocupados")
+    print(f"{'modo':>8} {'asignadas':>10} {'movidas':>8} {'minutos':>8} {'p50':>9} {'p95':>9} {'solapadas':>10}")
+    for modo in ('voraz', 'optimo'):
+        r = ejecutar(modo, casos)
+        print(f"{modo:>8} {r['asignadas']:>9.1f}% {r['movidas']:>8.2f} {r['minutos']:>8.1f} "
+              f"{r['p50']:>7.2f}ms {r['p95']:>7.2f}ms {r['solapadas']:>10}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CASOS_POR_DEFECTO)
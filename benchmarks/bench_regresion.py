@@ -0,0 +1,388 @@
+"""
+Suite de benchmarks con umbral de regresión: mide tiempo y memoria pico (tracemalloc) de
+la lectura de la hoja (el parser de cargar_reservas_desde_sheets), el índice por fecha,
+encontrar_horarios_disponibles_en_rango, procesar_reserva_con_rango_y_prioridad,
+calcular_metricas y los gráficos del dashboard, con 1 mil, 100 mil y 1 millón de reservas
+sintéticas (datos_sinteticos.py, siempre con la misma semilla).
+
+Cada caso puede tener varias implementaciones (CASOS): para medir una nueva basta con
+agregarla junto a la actual. Los resultados se comparan con linea_base.json y el script
+termina con código 1 si algún tiempo o memoria supera la línea base en más de la
+tolerancia, para usarlo como control en cada cambio. Un caso que parece una regresión se
+vuelve a medir REMEDICIONES veces (vale el mejor tiempo) antes de informarlo.
+
+Los casos con implementación 'referencia' (la lectura de la hoja, la búsqueda de horarios,
+las métricas y los gráficos; ver referencia.py) se comparan por la razón entre su tiempo y
+el de la referencia medida en la misma ejecución, que se guarda como 'relativo' en la
+línea base y sirve en cualquier máquina. La referencia misma no se compara.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_regresion.py                        # compara con la línea base
+    python benchmarks/bench_regresion.py --filas 1000 100000 --casos busqueda_horarios
+    python benchmarks/bench_regresion.py --guardar              # actualiza la línea base
+
+Los tiempos absolutos (los casos sin referencia y la memoria) dependen de la máquina: la
+línea base se regenera con --guardar en la misma máquina (o runner de CI) donde se va a
+verificar.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from nucleo_reservas.agenda import (IndiceReservasPorFecha, InstantaneaReservas,
+                                    encontrar_horarios_disponibles_en_rango,
+                                    procesar_reserva_con_rango_y_prioridad)
+from nucleo_reservas.almacen import AlmacenGoogleSheets, PlanificadorSolicitudes
+from nucleo_reservas.analitica import calcular_analitica, calcular_metricas
+from nucleo_reservas.config import CRITERIO_PRIORIDAD, obtener_granularidad, obtener_hora_local, obtener_salas
+from nucleo_reservas.modelo import Reserva, minutes_to_time
+
+from datos_sinteticos import SEMILLA, filas_de_hoja, generar_reservas, salas_para
+
+try:
+    import referencia
+    import reservas2 # Los gráficos se arman en la interfaz (Plotly)
+except ImportError as e: # Sin Streamlit/Plotly se miden solo los casos del núcleo, con tiempos absolutos
+    print(f"Aviso: sin los casos de gráficos ni la implementación de referencia ({e}).")
+    referencia = reservas2 = None
+
+RUTA_LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linea_base.json')
+FILAS_POR_DEFECTO = [1_000, 100_000, 1_000_000]
+DIAS_FUTUROS = 20 # Los datos llegan hasta hoy + DIAS_FUTUROS (reuniones que aún se pueden reubicar)
+BUSQUEDAS = 200
+SOLICITUDES = 50
+TOLERANCIA_TIEMPO = 0.30 # Fracción sobre la línea base antes de considerar una regresión
+TOLERANCIA_MEMORIA = 0.10
+HOLGURA_SEGUNDOS = 0.002 # Ruido aceptado en los casos de pocos milisegundos
+HOLGURA_MB = 0.5
+REMEDICIONES = 2 # Veces que se vuelve a medir una posible regresión antes de informarla
+MAX_FILAS_REFERENCIA = 100_000 # Filas que lee la lectura de referencia; su tiempo se escala al total
+TRABAJO_BUSQUEDA_REFERENCIA = 1_000_000 # Consultas x reservas que recorre la búsqueda de referencia
+
+class Datos:
+    """Reservas sintéticas de un tamaño y lo que se deriva de ellas, calculado una sola vez."""
+
+    def __init__(self, n):
+        self.n = n
+        self.salas = salas_para(n)
+        self.reservas = generar_reservas(n, SEMILLA, self.salas, date.today() + timedelta(days=DIAS_FUTUROS))
+        self._derivados = {}
+
+    def derivado(self, nombre, calcular):
+        if nombre not in self._derivados:
+            self._derivados[nombre] = calcular()
+        return self._derivados[nombre]
+
+    @property
+    def instantanea(self):
+        """Como la publica la caché, con su índice por fecha ya construido."""
+        def construir():
+            instantanea = InstantaneaReservas(self.reservas)
+            instantanea.por_fecha
+            return instantanea
+        return self.derivado('instantanea', construir)
+
+    @property
+    def analitica(self):
+        return self.derivado('analitica', lambda: calcular_analitica(self.reservas))
+
+# --- Servicio de Sheets en memoria ---
+class _Solicitud:
+    def __init__(self, respuesta):
+        self.respuesta = respuesta
+
+    def execute(self):
+        return self.respuesta
+
+class _ValoresEnMemoria:
+    """Solo values().get, que es lo que usa la recarga completa."""
+
+    def __init__(self, filas):
+        self.filas = filas
+
+    def values(self):
+        return self
+
+    def spreadsheets(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        return _Solicitud({'range': range, 'values': self.filas})
+# --- Fin Servicio de Sheets en memoria ---
+
+# --- Casos ---
+# Cada preparación recibe los Datos y devuelve la función a medir (sin argumentos), o
+# (función, factor) si la función hace solo una muestra del trabajo y su tiempo se
+# multiplica por `factor`; lo que hace preparar queda fuera de la medición.
+
+def preparar_ingesta(datos):
+    filas = datos.derivado('filas_hoja', lambda: filas_de_hoja(datos.reservas))
+    planificador = PlanificadorSolicitudes(lecturas_por_minuto=10**9, escrituras_por_minuto=10**9)
+    almacen = AlmacenGoogleSheets(_ValoresEnMemoria(filas), 'benchmark', 'Hoja 1', planificador=planificador)
+
+    def ingesta():
+        estado = almacen.nuevo_estado()
+        almacen._recarga_completa(estado)
+        assert len(estado['filas']) == datos.n
+    return ingesta
+
+def preparar_ingesta_referencia(datos):
+    filas = datos.derivado('filas_hoja', lambda: filas_de_hoja(datos.reservas))
+    muestra = filas[:MAX_FILAS_REFERENCIA + 1] # Con los encabezados
+    return (lambda: referencia.cargar_reservas(muestra)), (len(filas) - 1) / (len(muestra) - 1)
+
+def preparar_indice(datos):
+    return lambda: InstantaneaReservas(datos.reservas).por_fecha
+
+def _dias_con_reservas(datos, desde=None):
+    dias = sorted({r['fecha'] for r in datos.reservas})
+    return [d for d in dias if desde is None or d >= desde]
+
+def _consultas_busqueda(datos):
+    def generar():
+        azar = random.Random(SEMILLA)
+        dias, salas = _dias_con_reservas(datos), list(datos.salas)
+        consultas = []
+        for _ in range(BUSQUEDAS):
+            inicio = azar.randrange(8 * 60, 15 * 60 + 1, 30)
+            consultas.append((azar.choice(dias), minutes_to_time(inicio), minutes_to_time(min(17 * 60, inicio + 180)),
+                              azar.choice([30, 60, 90, 120]), azar.choice(salas)))
+        return consultas
+    return datos.derivado('consultas_busqueda', generar)
+
+def preparar_busqueda(datos):
+    consultas = _consultas_busqueda(datos)
+    reservas = datos.reservas
+
+    def busqueda():
+        # Índice nuevo en cada medición: las máscaras de ocupación se arman en frío
+        indice = IndiceReservasPorFecha(reservas)
+        for fecha, desde, hasta, duracion, sala in consultas:
+            encontrar_horarios_disponibles_en_rango(fecha, desde, hasta, indice, duracion, sala=sala)
+    return busqueda
+
+def preparar_busqueda_referencia(datos):
+    # La búsqueda lineal recorre todas las reservas por horario candidato: se mide una
+    # muestra de las consultas y el tiempo se escala a las BUSQUEDAS
+    consultas = _consultas_busqueda(datos)
+    muestra = consultas[:max(1, min(len(consultas), TRABAJO_BUSQUEDA_REFERENCIA // datos.n))]
+    reservas, paso = datos.reservas, obtener_granularidad()
+
+    def busqueda():
+        for fecha, desde, hasta, duracion, sala in muestra:
+            referencia.encontrar_horarios_disponibles_en_rango(fecha, desde, hasta, reservas, duracion, paso, sala)
+    return busqueda, len(consultas) / len(muestra)
+
+def preparar_procesar(modo):
+    def preparar(datos):
+        azar = random.Random(SEMILLA)
+        dias = _dias_con_reservas(datos, desde=date.today().isoformat())
+        hoy = obtener_hora_local().strftime('%Y-%m-%d %H:%M:%S') # Las reuniones de hoy se pueden reubicar
+        solicitudes = []
+        for i in range(SOLICITUDES):
+            inicio = azar.randrange(8 * 60, 15 * 60 + 1, 30)
+            solicitudes.append((Reserva({
+                'id': f"BENCH-{i}", 'nombre': 'Persona', 'email': 'persona@ejemplo.cl', 'fecha': azar.choice(dias),
+                'hora_inicio_rango': minutes_to_time(inicio),
+                'hora_fin_rango': minutes_to_time(min(17 * 60, inicio + azar.choice([90, 120, 180]))),
+                'hora_inicio': '', 'hora_fin': '', 'criterio': list(CRITERIO_PRIORIDAD)[0],
+                'num_asistentes': azar.randint(2, 10), 'proposito': 'Reunión', 'fecha_reserva': hoy,
+            }), azar.choice([60, 90, 120])))
+        instantanea = datos.instantanea
+
+        def procesar():
+            for nueva, duracion in solicitudes:
+                procesar_reserva_con_rango_y_prioridad(nueva.copy(), instantanea, duracion, modo)
+        return procesar
+    return preparar
+
+def preparar_metricas(calcular):
+    return lambda datos: (lambda: calcular(datos.reservas))
+
+def preparar_graficos(datos):
+    analitica = datos.analitica
+
+    def graficos():
+        reservas2.crear_grafico_ocupacion_semanal(analitica)
+        reservas2.crear_grafico_prioridades(analitica['metricas'])
+        reservas2.crear_grafico_tendencia_mensual(analitica)
+        reservas2.crear_mapa_calor_horarios(analitica)
+        reservas2.crear_grafico_asistentes_criterio(analitica)
+    return graficos
+
+def preparar_graficos_referencia(datos):
+    reservas = datos.reservas
+
+    def graficos():
+        metricas = referencia.calcular_metricas(reservas)
+        referencia.crear_grafico_ocupacion_semanal(reservas)
+        reservas2.crear_grafico_prioridades(metricas)
+        referencia.crear_grafico_tendencia_mensual(reservas)
+        referencia.crear_mapa_calor_horarios(reservas)
+        referencia.asistentes_por_criterio(reservas)
+    return graficos
+
+# caso -> {implementación: preparar}; 'actual' es la que usa la aplicación y 'referencia'
+# la que se usa como patrón de tiempo en la misma ejecución
+CASOS = {
+    'ingesta_sheets': {'actual': preparar_ingesta},
+    'indice_por_fecha': {'actual': preparar_indice},
+    'busqueda_horarios': {'actual': preparar_busqueda},
+    'procesar_reserva': {'actual': preparar_procesar(None), 'voraz': preparar_procesar('voraz')},
+    'calcular_metricas': {'actual': preparar_metricas(calcular_metricas)},
+}
+if reservas2 is not None:
+    CASOS['ingesta_sheets']['referencia'] = preparar_ingesta_referencia
+    CASOS['busqueda_horarios']['referencia'] = preparar_busqueda_referencia
+    CASOS['calcular_metricas']['referencia'] = preparar_metricas(referencia.calcular_metricas)
+    CASOS['graficos'] = {'actual': preparar_graficos, 'referencia': preparar_graficos_referencia}
+# --- Fin Casos ---
+
+def repeticiones_para(n):
+    return 5 if n <= 10_000 else 3 if n <= 100_000 else 1
+
+def medir(funcion, repeticiones, factor=1):
+    """
+    {'segundos': mejor tiempo multiplicado por `factor`, 'memoria_mb': memoria pico de una
+    ejecución aparte con tracemalloc}.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'segundos': round(min(tiempos) * factor, 6), 'memoria_mb': round(pico / 2**20, 3)}
+
+def _preparado(preparar, datos):
+    preparado = preparar(datos)
+    return preparado if isinstance(preparado, tuple) else (preparado, 1)
+
+def _mejor(anterior, nueva):
+    return {clave: min(anterior[clave], nueva[clave]) for clave in ('segundos', 'memoria_mb')}
+
+def _con_relativo(medidos):
+    """Agrega a cada implementación su tiempo relativo a la referencia (si el caso tiene una)."""
+    patron = medidos.get('referencia')
+    for implementacion, medido in medidos.items():
+        if patron is not None and implementacion != 'referencia':
+            medido['relativo'] = round(medido['segundos'] / max(patron['segundos'], 1e-9), 4)
+
+def cargar_linea_base(ruta):
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f).get('resultados', {})
+
+def guardar_linea_base(ruta, resultados):
+    anteriores = cargar_linea_base(ruta)
+    anteriores.update(resultados)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'maquina': f"{platform.machine()} {platform.processor() or platform.system()}",
+                   'python': platform.python_version(),
+                   'generada': date.today().isoformat(),
+                   'resultados': dict(sorted(anteriores.items()))}, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+def comparar(medido, base, tolerancia_tiempo, tolerancia_memoria):
+    """
+    Lista de motivos de regresión (vacía si está dentro de la tolerancia). Si ambos tienen
+    tiempo relativo a la referencia se compara ese; si no, el tiempo absoluto.
+    """
+    motivos = []
+    if 'relativo' in medido and 'relativo' in base:
+        segundos_referencia = medido['segundos'] / max(medido['relativo'], 1e-9)
+        limite = base['relativo'] * (1 + tolerancia_tiempo) * segundos_referencia + HOLGURA_SEGUNDOS
+        if medido['segundos'] > limite:
+            motivos.append(f"tiempo relativo {medido['relativo'] / base['relativo']:.2f}x")
+    elif medido['segundos'] > base['segundos'] * (1 + tolerancia_tiempo) + HOLGURA_SEGUNDOS:
+        motivos.append(f"tiempo {medido['segundos'] / base['segundos']:.2f}x")
+    if medido['memoria_mb'] > base['memoria_mb'] * (1 + tolerancia_memoria) + HOLGURA_MB:
+        motivos.append(f"memoria {medido['memoria_mb'] / max(base['memoria_mb'], 1e-9):.2f}x")
+    return motivos
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, nargs='+', default=FILAS_POR_DEFECTO)
+    parser.add_argument('--casos', nargs='+', choices=sorted(CASOS), default=sorted(CASOS))
+    parser.add_argument('--guardar', action='store_true', help="actualiza la línea base con estos resultados")
+    parser.add_argument('--linea-base', default=RUTA_LINEA_BASE)
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_TIEMPO)
+    parser.add_argument('--tolerancia-memoria', type=float, default=TOLERANCIA_MEMORIA)
+    args = parser.parse_args(argumentos)
+
+    base = cargar_linea_base(args.linea_base)
+    resultados, regresiones = {}, []
+    print(f"{'caso':<20} {'implementación':<15} {'filas':>10} {'tiempo':>11} {'memoria':>10} {'relativo':>9} "
+          f"{'base':>11}  estado")
+    for n in args.filas:
+        inicio = time.perf_counter()
+        datos = Datos(n)
+        # La asignación considera solo las salas configuradas: se usan las de los datos
+        os.environ['RESERVAS_SALAS'] = json.dumps(datos.salas)
+        obtener_salas.cache_clear()
+        print(f"-- {n:,} reservas en {len(datos.salas)} sala(s), generadas en {time.perf_counter() - inicio:.1f} s")
+        for caso in args.casos:
+            funciones = {implementacion: _preparado(preparar, datos)
+                         for implementacion, preparar in CASOS[caso].items()}
+            medidos = {implementacion: medir(funcion, repeticiones_para(n), factor)
+                       for implementacion, (funcion, factor) in funciones.items()}
+            _con_relativo(medidos)
+            for implementacion, medido in medidos.items():
+                clave = f"{caso}/{implementacion}/{n}"
+                anterior = base.get(clave)
+                if anterior is None:
+                    estado, referencia_base = 'sin línea base', '-'
+                elif implementacion == 'referencia':
+                    estado, referencia_base = 'patrón', f"{anterior['segundos'] * 1000:.1f}ms"
+                else:
+                    motivos = comparar(medido, anterior, args.tolerancia, args.tolerancia_memoria)
+                    for _ in range(REMEDICIONES if motivos else 0):
+                        # Puede ser ruido de la máquina: se vuelve a medir (con la referencia) y vale el mejor
+                        for remedida in [implementacion] + (['referencia'] if 'relativo' in medido else []):
+                            funcion, factor = funciones[remedida]
+                            nueva = medir(funcion, repeticiones_para(n), factor)
+                            medidos[remedida].update(_mejor(medidos[remedida], nueva))
+                        _con_relativo(medidos)
+                        motivos = comparar(medido, anterior, args.tolerancia, args.tolerancia_memoria)
+                        if not motivos:
+                            break
+                    estado = 'REGRESIÓN: ' + ', '.join(motivos) if motivos else 'ok'
+                    referencia_base = f"{anterior['segundos'] * 1000:.1f}ms"
+                    if motivos:
+                        regresiones.append(clave)
+                relativo = f"{medido['relativo']:.3f}x" if 'relativo' in medido else '-'
+                print(f"{caso:<20} {implementacion:<15} {n:>10,} {medido['segundos'] * 1000:>9.1f}ms "
+                      f"{medido['memoria_mb']:>8.1f}MB {relativo:>9} {referencia_base:>11}  {estado}")
+            for implementacion, medido in medidos.items():
+                resultados[f"{caso}/{implementacion}/{n}"] = medido
+        del datos
+        gc.collect()
+
+    if args.guardar:
+        guardar_linea_base(args.linea_base, resultados)
+        print(f"Línea base actualizada en {args.linea_base} ({len(resultados)} resultados).")
+        return 0
+    if regresiones:
+        print(f"{len(regresiones)} regresión(es) sobre la línea base: {', '.join(regresiones)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Prueba de carga con varias sesiones a la vez: N usuarios simulados confirman reservas al
+mismo tiempo con los pasos del botón "Confirmar reserva" de reservas2.py (ID del
+asignador, instantánea de la caché compartida, procesar_reserva_con_rango_y_prioridad,
+guardar y confirmar el ID), contra una base SQLite temporal o contra la hoja falsa de
+sheets_falso.py. Informa la latencia p50/p95/p99 de la confirmación, las llamadas a Sheets
+por reserva y cuántas reservas guardadas se solapan en la misma sala, además de los IDs
+duplicados y las reservas confirmadas que no llegaron al almacén.
+
+Cada servidor (--servidores) tiene su propia CacheReservas, como obtener_cache_reservas en
+un proceso de Streamlit, y los usuarios se reparten entre ellos. Con --instantanea
+formulario cada sesión asigna con la instantánea que tenía al dibujar el formulario (como
+st.session_state.reservas antes de pulsar el botón); con confirmar (por defecto, el flujo
+actual) la vuelve a tomar al confirmar. Las reservas se piden en pocas fechas para que
+compitan por los mismos horarios.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/carga_concurrente.py --usuarios 20 --reservas-por-usuario 5
+    python benchmarks/carga_concurrente.py --almacen sheets --latencia-ms 150 --servidores 2
+    python benchmarks/carga_concurrente.py --max-solapes 0 --max-p95-ms 500  # control antes/después
+
+Con --max-solapes o --max-p95-ms el script termina con código 1 si se superan.
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from nucleo_reservas.agenda import procesar_reserva_con_rango_y_prioridad
+from nucleo_reservas.almacen import AlmacenGoogleSheets, AlmacenSQLite, PlanificadorSolicitudes
+from nucleo_reservas.cache import CacheReservas, DiarioReservas, HorarioOcupado
+from nucleo_reservas.calendario import es_dia_habil
+from nucleo_reservas.config import (CRITERIO_PRIORIDAD, DURACIONES_REUNION, HORA_FIN_DIA, HORA_INICIO_DIA,
+                                    obtener_hora_local, obtener_salas)
+from nucleo_reservas.modelo import Reserva, minutes_to_time, time_to_minutes
+
+from datos_sinteticos import NOMBRES, PESOS_CRITERIO, SEMILLA, filas_de_hoja, generar_reservas, salas_sinteticas
+
+DIAS_DE_ANTICIPACION = 15 # Las fechas disputadas cumplen el plazo de todos los criterios
+ESPERA_ENVIO_SEGUNDOS = 120 # Máximo para que los diarios terminen de enviar al almacén
+LECTURAS_SHEETS = ('get', 'batchGet')
+
+def fechas_disputadas(cantidad):
+    """Los `cantidad` primeros días hábiles a partir de DIAS_DE_ANTICIPACION días."""
+    fechas, dia = [], date.today() + timedelta(days=DIAS_DE_ANTICIPACION)
+    while len(fechas) < cantidad:
+        if es_dia_habil(dia):
+            fechas.append(dia.isoformat())
+        dia += timedelta(days=1)
+    return fechas
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) por rango más cercano; 0 si no hay valores."""
+    if not valores_ordenados:
+        return 0.0
+    posicion = max(0, min(len(valores_ordenados) - 1, -(-len(valores_ordenados) * p // 100) - 1))
+    return valores_ordenados[int(posicion)]
+
+# --- Backends ---
+class Backend:
+    """Almacén de la prueba: crea uno por servidor simulado y otro para verificar al final."""
+
+    def __init__(self, args, historial):
+        self.directorio = tempfile.mkdtemp(prefix='carga_reservas_')
+        self.hoja = self.servidor_http = None
+        if args.almacen == 'sheets':
+            from sheets_falso import HojaFalsa, crear_servicio, iniciar_servidor
+            self.hoja = HojaFalsa(filas_de_hoja(historial), latencia=args.latencia_ms / 1000,
+                                  variacion=args.variacion_ms / 1000, tasa_429=args.tasa_429,
+                                  semilla=args.semilla)
+            self.servidor_http, self.url = iniciar_servidor(self.hoja)
+            self._crear_servicio = crear_servicio
+        else:
+            self.ruta = os.path.join(self.directorio, 'reservas.db')
+            almacen = AlmacenSQLite(self.ruta)
+            if historial:
+                almacen.escribir_lote(almacen.nuevo_estado(), historial)
+
+    def nuevo_almacen(self):
+        if self.hoja is None:
+            return AlmacenSQLite(self.ruta)
+        # Un servicio y un planificador por servidor, como en procesos separados
+        return AlmacenGoogleSheets(self._crear_servicio(self.url), 'hoja-falsa', self.hoja.nombre,
+                                   planificador=PlanificadorSolicitudes())
+
+    def llamadas(self):
+        """(lecturas, escrituras, rechazadas) atendidas por la hoja falsa; ceros con SQLite."""
+        if self.hoja is None:
+            return 0, 0, 0
+        estadisticas = self.hoja.estadisticas()
+        lecturas = sum(n for metodo, n in estadisticas['llamadas'].items() if metodo in LECTURAS_SHEETS)
+        escrituras = sum(estadisticas['llamadas'].values()) - lecturas
+        return lecturas, escrituras, sum(estadisticas['rechazadas'].values())
+
+    def cerrar(self):
+        if self.servidor_http is not None:
+            self.servidor_http.shutdown()
+        shutil.rmtree(self.directorio, ignore_errors=True)
+# --- Fin Backends ---
+
+# --- Sesiones simuladas ---
+def nueva_solicitud(azar, usuario, fechas, capacidad_maxima):
+    """Reserva como la arma el formulario, con rango, criterio y duración al azar."""
+    inicio_dia, fin_dia = time_to_minutes(HORA_INICIO_DIA), time_to_minutes(HORA_FIN_DIA)
+    ancho = azar.choice((60, 90, 120, 180))
+    inicio = inicio_dia + 30 * azar.randrange((fin_dia - inicio_dia - ancho) // 30 + 1)
+    criterios = [c for c, peso in zip(CRITERIO_PRIORIDAD, PESOS_CRITERIO) for _ in range(peso)]
+    nombre = NOMBRES[usuario % len(NOMBRES)]
+    reserva = Reserva({
+        "nombre": nombre,
+        "email": f"usuario{usuario}@ejemplo.cl",
+        "fecha": azar.choice(fechas),
+        "hora_inicio_rango": minutes_to_time(inicio),
+        "hora_fin_rango": minutes_to_time(inicio + ancho),
+        "hora_inicio": "",
+        "hora_fin": "",
+        "criterio": azar.choice(criterios),
+        "num_asistentes": azar.randint(2, min(8, capacidad_maxima)),
+        "proposito": "Prueba de carga",
+        "fecha_reserva": obtener_hora_local().strftime('%Y-%m-%d %H:%M:%S'),
+        "sala": "",
+    })
+    duracion = azar.choice([d for d in DURACIONES_REUNION if d <= ancho])
+    return reserva, duracion
+
+def sesion(usuario, cache, args, fechas, capacidad_maxima, partida, resultados):
+    """
+    Un usuario: dibuja el formulario (toma la instantánea), lo llena durante una pausa al
+    azar y confirma. Se mide desde que pulsa el botón hasta que la reserva quedó guardada.
+    """
+    azar = random.Random(args.semilla * 1000 + usuario)
+    partida.wait() # Todas las sesiones empiezan juntas
+    for _ in range(args.reservas_por_usuario):
+        _, instantanea = cache.obtener()
+        time.sleep(azar.uniform(0, args.pausa_ms / 1000))
+        reserva, duracion = nueva_solicitud(azar, usuario, fechas, capacidad_maxima)
+        inicio = time.perf_counter()
+        try:
+            reserva['id'] = cache.asignador.reservar(reserva['fecha'])
+            if args.instantanea == 'confirmar':
+                _, instantanea = cache.obtener()
+            exito, _, horario, reubicadas = procesar_reserva_con_rango_y_prioridad(
+                reserva, instantanea, duracion, args.modo)
+            if exito:
+                reserva['hora_inicio'], reserva['hora_fin'] = horario
+                cache.guardar(reserva, reubicadas)
+                cache.asignador.confirmar(reserva['id'])
+                estado = 'confirmada'
+            else:
+                cache.asignador.liberar(reserva['id'])
+                estado = 'sin horario'
+        except HorarioOcupado:
+            cache.asignador.liberar(reserva['id']) # Otra sesión ganó el horario, como en la interfaz
+            estado = 'ocupada'
+        except Exception as e:
+            print(f"Usuario {usuario}: error al confirmar {reserva.get('id')}: {e}")
+            estado = 'error'
+        resultados.append((estado, time.perf_counter() - inicio))
+
+def esperar_envio(caches, limite=ESPERA_ENVIO_SEGUNDOS):
+    """Espera a que los diarios terminen de enviar al almacén; False si se agotó el plazo."""
+    fin = time.monotonic() + limite
+    while any(cache.pendientes_de_envio for cache in caches):
+        if time.monotonic() > fin:
+            return False
+        time.sleep(0.05)
+    return True
+# --- Fin Sesiones simuladas ---
+
+# --- Verificación de lo guardado ---
+def contar_solapes(reservas, fechas):
+    """
+    Pares de reservas guardadas que se solapan en la misma fecha y sala (solo en `fechas`),
+    cantidad de (fecha, sala) afectados e IDs repetidos en todo el almacén.
+    """
+    por_sala = collections.defaultdict(list)
+    for r in reservas:
+        if r['fecha'] in fechas and r['hora_inicio'] and r['hora_fin']:
+            por_sala[(r['fecha'], r['sala'])].append((time_to_minutes(r['hora_inicio']),
+                                                      time_to_minutes(r['hora_fin'])))
+    pares, afectadas = 0, 0
+    for intervalos in por_sala.values():
+        intervalos.sort()
+        antes = pares
+        for i, (_, fin) in enumerate(intervalos):
+            for inicio_siguiente, _ in intervalos[i + 1:]:
+                if inicio_siguiente >= fin:
+                    break
+                pares += 1
+        afectadas += pares > antes
+    repetidos = sum(n - 1 for n in collections.Counter(r['id'] for r in reservas).values() if n > 1)
+    return pares, afectadas, repetidos
+# --- Fin Verificación de lo guardado ---
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--reservas-por-usuario', type=int, default=5)
+    parser.add_argument('--servidores', type=int, default=1, help="procesos de Streamlit simulados")
+    parser.add_argument('--almacen', choices=('sqlite', 'sheets'), default='sqlite')
+    parser.add_argument('--instantanea', choices=('confirmar', 'formulario'), default='confirmar',
+                        help="cuándo toma la sesión las reservas con que asigna")
+    parser.add_argument('--sin-diario', action='store_true', help="escribe en el almacén al confirmar")
+    parser.add_argument('--modo', choices=('optimo', 'voraz'), help="por defecto el configurado")
+    parser.add_argument('--dias', type=int, default=2, help="fechas por las que compiten los usuarios")
+    parser.add_argument('--salas', type=int, help="cantidad de salas sintéticas (por defecto las configuradas)")
+    parser.add_argument('--historial', type=int, default=1000, help="reservas anteriores en el almacén")
+    parser.add_argument('--pausa-ms', type=float, default=200.0, help="tiempo máximo llenando el formulario")
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="latencia de la hoja falsa")
+    parser.add_argument('--variacion-ms', type=float, default=0.0)
+    parser.add_argument('--tasa-429', type=float, default=0.0)
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    parser.add_argument('--max-solapes', type=int,
+                        help="máximo aceptado de pares solapados, IDs duplicados y confirmadas sin guardar")
+    parser.add_argument('--max-p95-ms', type=float, help="máxima latencia p95 aceptada")
+    args = parser.parse_args(argumentos)
+
+    if args.salas:
+        # La asignación considera solo las salas configuradas: se usan las sintéticas
+        os.environ['RESERVAS_SALAS'] = json.dumps(salas_sinteticas(args.salas))
+        obtener_salas.cache_clear()
+    salas = obtener_salas()
+    historial = generar_reservas(args.historial, args.semilla, salas, hasta=date.today() - timedelta(days=1)) \
+        if args.historial else []
+    fechas = fechas_disputadas(args.dias)
+    backend = Backend(args, historial)
+    try:
+        caches = []
+        for i in range(args.servidores):
+            diario = None if args.sin_diario else DiarioReservas(os.path.join(backend.directorio, f'diario_{i}.db'))
+            cache = CacheReservas(backend.nuevo_almacen(), diario=diario)
+            cache.obtener() # Carga inicial del servidor, fuera de la medición
+            caches.append(cache)
+        if backend.hoja is not None:
+            backend.hoja.reiniciar_estadisticas()
+
+        print(f"-- {args.usuarios} usuario(s) x {args.reservas_por_usuario} reserva(s) en {args.servidores} "
+              f"servidor(es), almacén {args.almacen}, instantánea al {args.instantanea}, "
+              f"{'sin' if args.sin_diario else 'con'} diario, {len(salas)} sala(s), fechas {', '.join(fechas)}")
+        partida = threading.Barrier(args.usuarios)
+        resultados = []
+        hilos = [threading.Thread(target=sesion, args=(u, caches[u % len(caches)], args, fechas,
+                                                       max(salas.values()), partida, resultados))
+                 for u in range(args.usuarios)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        if not esperar_envio(caches):
+            print(f"Advertencia: quedaron {sum(c.pendientes_de_envio for c in caches)} reserva(s) sin enviar "
+                  f"al almacén después de {ESPERA_ENVIO_SEGUNDOS} s.")
+        lecturas, escrituras, rechazadas = backend.llamadas()
+
+        # Lo que quedó guardado, leído de nuevo desde el almacén
+        almacen = backend.nuevo_almacen()
+        estado_almacen = almacen.nuevo_estado()
+        almacen.sincronizar(estado_almacen)
+        guardadas = list(estado_almacen['filas'].values())
+        pares, afectadas, repetidos = contar_solapes(guardadas, set(fechas))
+    finally:
+        backend.cerrar()
+
+    por_estado = collections.Counter(estado for estado, _ in resultados)
+    latencias = sorted(segundos * 1000 for _, segundos in resultados)
+    p50, p95, p99 = (percentil(latencias, p) for p in (50, 95, 99))
+    confirmadas = por_estado['confirmada']
+    perdidas = max(0, confirmadas - (len(guardadas) - len(historial)))
+    print(f"Confirmadas {confirmadas}, sin horario {por_estado['sin horario']}, ocupadas al guardar "
+          f"{por_estado['ocupada']}, errores {por_estado['error']} en {duracion:.1f} s")
+    print(f"Latencia de confirmación: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms "
+          f"(máx. {latencias[-1] if latencias else 0:.1f} ms)")
+    if backend.hoja is not None:
+        por_reserva = (lecturas + escrituras) / max(confirmadas, 1)
+        print(f"Llamadas a Sheets por reserva: {por_reserva:.2f} (lecturas {lecturas}, escrituras {escrituras}, "
+              f"rechazadas con 429 {rechazadas})")
+    print(f"Reservas guardadas: {len(guardadas):,}; pares solapados: {pares} en {afectadas} sala(s)-día; "
+          f"IDs duplicados: {repetidos}; confirmadas sin guardar: {perdidas}")
+
+    fallas = []
+    if args.max_solapes is not None and pares + repetidos + perdidas > args.max_solapes:
+        fallas.append(f"{pares} solape(s), {repetidos} ID(s) duplicado(s) y {perdidas} confirmada(s) sin "
+                      f"guardar (máximo {args.max_solapes})")
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        fallas.append(f"p95 {p95:.1f} ms (máximo {args.max_p95_ms:.1f} ms)")
+    if fallas:
+        print(f"Control no superado: {'; '.join(fallas)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
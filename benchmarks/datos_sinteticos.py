@@ -0,0 +1,135 @@
+"""
+Historiales sintéticos y reproducibles de reservas para los benchmarks: IDs RES-YYYYMMDD-NNN
+correlativos por fecha, los cuatro criterios, duraciones del formulario y reuniones que no
+se solapan dentro de cada sala, de lunes a viernes entre HORA_INICIO_DIA y HORA_FIN_DIA.
+
+Para que los volúmenes grandes no se extiendan por siglos ni superen los 999 IDs por día,
+las reservas se reparten en varias salas (salas_sinteticas) hacia atrás desde `hasta`.
+
+Uso (desde la raíz del repositorio), para importar un historial en una hoja de pruebas:
+    python benchmarks/datos_sinteticos.py 10000 --csv reservas_sinteticas.csv [--semilla 7]
+"""
+import argparse
+import collections
+import csv
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from nucleo_reservas.almacen import _reserva_a_fila
+from nucleo_reservas.config import CRITERIO_PRIORIDAD, DURACIONES_REUNION, HORA_FIN_DIA, HORA_INICIO_DIA
+from nucleo_reservas.modelo import COLUMNAS_RESERVA, Reserva, minutes_to_time, time_to_minutes
+
+SEMILLA = 2024
+RESERVAS_POR_SALA = 5000 # Salas usadas por salas_para(n): una cada tantas reservas
+MAXIMO_POR_DIA = 999 # El correlativo del ID tiene tres dígitos
+PESOS_CRITERIO = (1, 2, 5, 3) # Más reuniones de equipo que supervisiones
+CAPACIDADES = (6, 10, 20, 4)
+NOMBRES = ('Ana Pérez', 'Bruno Soto', 'Carla Muñoz', 'Diego Rojas', 'Elena Díaz', 'Felipe Vera',
+           'Gabriela Silva', 'Hugo Castro', 'Isabel Fuentes', 'Javier Morales')
+PROPOSITOS = ('Reunión de equipo', 'Supervisión de caso', 'Mesa territorial', 'Capacitación',
+              'Coordinación semanal', 'Reunión con la comunidad')
+HUECOS_MINUTOS = (0, 0, 0, 15, 30, 60) # Espacio libre antes de cada reunión
+
+def salas_sinteticas(cantidad):
+    """Salas 'Sala 01', 'Sala 02', ... con capacidades variadas (nombre -> capacidad)."""
+    return {f"Sala {i + 1:02d}": CAPACIDADES[i % len(CAPACIDADES)] for i in range(cantidad)}
+
+def salas_para(n):
+    """Salas con las que n reservas ocupan del orden de 1.000 días hábiles como máximo."""
+    return salas_sinteticas(max(1, -(-n // RESERVAS_POR_SALA)))
+
+def generar_reservas(n, semilla=SEMILLA, salas=None, hasta=None, reuniones_por_sala=(2, 6)):
+    """
+    n Reservas sin solapes por sala, generadas día hábil por día hábil hacia atrás desde
+    `hasta` (por defecto hoy): cada sala recibe entre `reuniones_por_sala` reuniones,
+    seguidas o con un hueco. `salas` es un diccionario nombre -> capacidad (por defecto
+    salas_para(n)). La fecha de solicitud es de 1 a 20 días antes de la reunión; para las
+    reuniones de hoy en adelante, a veces es hoy (solo esas se pueden reubicar).
+    """
+    azar = random.Random(semilla)
+    r = azar.random # Índices con r() en vez de choice/randint: es lo que más pesa con 1M de filas
+    salas = salas or salas_para(n)
+    hasta = hasta or date.today()
+    hoy = date.today()
+    criterios = list(CRITERIO_PRIORIDAD)
+    inicio_dia, fin_dia = time_to_minutes(HORA_INICIO_DIA), time_to_minutes(HORA_FIN_DIA)
+    horas = [minutes_to_time(m) for m in range(24 * 60)] # 'HH:MM' precalculadas
+    ponderados = [c for c, peso in zip(criterios, PESOS_CRITERIO) for _ in range(peso)]
+    correos = [nombre.split()[0].lower() + '@ejemplo.cl' for nombre in NOMBRES]
+    minimo, maximo = reuniones_por_sala
+    dias = [] # Reservas de cada día, del más reciente al más antiguo
+    total = 0
+    dia = hasta
+    while total < n:
+        if dia.weekday() < 5:
+            fecha, fecha_id = dia.isoformat(), dia.strftime('%Y%m%d')
+            del_dia = []
+            for sala, capacidad in salas.items():
+                minuto = inicio_dia
+                for _ in range(minimo + int(r() * (maximo - minimo + 1))):
+                    minuto += HUECOS_MINUTOS[int(r() * len(HUECOS_MINUTOS))]
+                    duracion = DURACIONES_REUNION[int(r() * len(DURACIONES_REUNION))]
+                    if minuto + duracion > fin_dia or len(del_dia) == MAXIMO_POR_DIA or total == n:
+                        break
+                    total += 1
+                    solicitada = hoy if dia >= hoy and r() < 0.3 else dia - timedelta(days=1 + int(r() * 20))
+                    persona = int(r() * len(NOMBRES))
+                    del_dia.append(Reserva({
+                        'id': f"RES-{fecha_id}-{len(del_dia) + 1:03d}",
+                        'nombre': NOMBRES[persona],
+                        'email': correos[persona],
+                        'fecha': fecha,
+                        'hora_inicio_rango': horas[max(inicio_dia, minuto - 60)],
+                        'hora_fin_rango': horas[min(fin_dia, minuto + duracion + 60)],
+                        'hora_inicio': horas[minuto],
+                        'hora_fin': horas[minuto + duracion],
+                        'criterio': ponderados[int(r() * len(ponderados))],
+                        'num_asistentes': 2 + int(r() * (capacidad - 1)),
+                        'proposito': PROPOSITOS[int(r() * len(PROPOSITOS))],
+                        'fecha_reserva': f"{solicitada.isoformat()} {horas[inicio_dia + int(r() * (fin_dia - inicio_dia))]}:00",
+                        'sala': sala,
+                    }))
+                    minuto += duracion
+            dias.append(del_dia)
+        dia -= timedelta(days=1)
+    # Orden de la hoja: las más antiguas primero
+    return [reserva for del_dia in reversed(dias) for reserva in del_dia]
+
+def filas_de_hoja(reservas, encabezados=True):
+    """
+    Valores como los devuelve values().get de Sheets: texto, sin las celdas vacías del
+    final de cada fila y, con `encabezados`, precedidos por la fila 1.
+    """
+    filas = [list(COLUMNAS_RESERVA)] if encabezados else []
+    for reserva in reservas:
+        fila = [str(valor) for valor in _reserva_a_fila(reserva)]
+        while fila and fila[-1] == '':
+            fila.pop()
+        filas.append(fila)
+    return filas
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Genera un historial sintético de reservas.")
+    parser.add_argument('filas', type=int)
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    parser.add_argument('--salas', type=int, help="cantidad de salas (por defecto según las filas)")
+    parser.add_argument('--csv', help="archivo de salida con las columnas de la hoja (A a N)")
+    args = parser.parse_args(argumentos)
+
+    salas = salas_sinteticas(args.salas) if args.salas else None
+    reservas = generar_reservas(args.filas, args.semilla, salas)
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(filas_de_hoja(reservas))
+        print(f"{len(reservas):,} reservas escritas en {args.csv}.")
+    if reservas:
+        print(f"Desde {reservas[0]['fecha']} hasta {reservas[-1]['fecha']}; por criterio:")
+        for criterio, cantidad in sorted(collections.Counter(r['criterio'] for r in reservas).items()):
+            print(f"  {criterio}: {cantidad:,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Escenarios de fallas de escritura contra la hoja falsa de sheets_falso.py: cada uno prepara
+una hoja, hace fallar una llamada a la API (HojaFalsa.fallar) y revisa que la hoja quede
+consistente. A diferencia de los benchmarks no mide tiempos: termina con código 1 si algún
+escenario no se cumple, para usarlo como control después de tocar la escritura.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/fallas_escritura.py
+    python benchmarks/fallas_escritura.py --escenarios append_rechazado
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from nucleo_reservas.almacen import AlmacenGoogleSheets, PlanificadorSolicitudes
+from nucleo_reservas.modelo import Reserva
+
+from datos_sinteticos import filas_de_hoja
+from sheets_falso import HojaFalsa, crear_servicio, iniciar_servidor
+
+FECHA = '2030-03-04'
+SALA = 'Sala de Reuniones'
+CRITERIO_ALTO = '1 - Reuniones de Supervisión de casos'
+CRITERIO_BAJO = '4 - Reuniones Generales (mínimo 4 personas)'
+
+def _reserva(id_reserva, hora_inicio, hora_fin, criterio=CRITERIO_BAJO):
+    return Reserva({
+        'id': id_reserva, 'nombre': 'Persona', 'email': 'persona@ejemplo.cl', 'fecha': FECHA,
+        'hora_inicio_rango': '09:00', 'hora_fin_rango': '17:00', 'hora_inicio': hora_inicio, 'hora_fin': hora_fin,
+        'criterio': criterio, 'num_asistentes': 4, 'proposito': 'Prueba de fallas',
+        'fecha_reserva': '2030-02-01 09:00:00', 'sala': SALA, 'serie': '',
+    })
+
+class Escenario:
+    """Hoja falsa con dos reuniones seguidas (09:00 y 10:30) y un almacén conectado a ella."""
+
+    def __init__(self):
+        self.hoja = HojaFalsa(filas_de_hoja([_reserva('RES-20300304-001', '09:00', '10:30'),
+                                             _reserva('RES-20300304-002', '10:30', '12:00')]))
+        self.servidor, url = iniciar_servidor(self.hoja)
+        # Sin reintentos: cada falla simulada llega tal cual al almacén
+        self.almacen = AlmacenGoogleSheets(crear_servicio(url), 'hoja-falsa', self.hoja.nombre,
+                                           planificador=PlanificadorSolicitudes(max_reintentos=0))
+        self.estado = self.almacen.nuevo_estado()
+        self.almacen.sincronizar(self.estado)
+
+    def horario(self, num_fila):
+        return self.hoja.filas[num_fila - 1][6:8]
+
+    def ids(self):
+        return [fila[0] for fila in self.hoja.filas[1:] if fila]
+
+    def cerrar(self):
+        self.servidor.shutdown()
+
+def _append_fallido(codigo, aplicar):
+    """
+    Una reserva de mayor prioridad toma las 09:00 y mueve la primera reunión a las 12:00; el
+    append de la reserva nueva falla con `codigo`. Si no llegó a la hoja, la reunión movida
+    debe volver a las 09:00; si llegó (`aplicar`), debe quedar a las 12:00.
+    """
+    escenario = Escenario()
+    try:
+        nueva = _reserva('RES-20300304-003', '09:00', '10:30', CRITERIO_ALTO)
+        movida = dict(escenario.estado['filas'][2], hora_inicio='12:00', hora_fin='13:30')
+        escenario.hoja.fallar('append', codigo, aplicar)
+        try:
+            escenario.almacen.escribir_lote(escenario.estado, [nueva], [movida])
+        except Exception:
+            pass
+        else:
+            return ["el append no falló"]
+        esperado = ['12:00', '13:30'] if aplicar else ['09:00', '10:30']
+        problemas = []
+        if escenario.horario(2) != esperado:
+            problemas.append(f"la reunión movida quedó en {escenario.horario(2)} (se esperaba {esperado})")
+        if (nueva['id'] in escenario.ids()) != aplicar:
+            problemas.append(f"la reserva nueva {'no ' if aplicar else ''}está en la hoja")
+        return problemas
+    finally:
+        escenario.cerrar()
+
+ESCENARIOS = {
+    'append_rechazado': lambda: _append_fallido(400, aplicar=False),
+    'append_error_servidor': lambda: _append_fallido(503, aplicar=False),
+    'append_respuesta_perdida': lambda: _append_fallido(503, aplicar=True),
+}
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--escenarios', nargs='+', choices=sorted(ESCENARIOS), default=list(ESCENARIOS))
+    args = parser.parse_args(argumentos)
+
+    fallidos = []
+    for nombre in args.escenarios:
+        problemas = ESCENARIOS[nombre]()
+        print(f"{nombre:<28} {'ok' if not problemas else 'FALLA: ' + '; '.join(problemas)}")
+        if problemas:
+            fallidos.append(nombre)
+    if fallidos:
+        print(f"{len(fallidos)} escenario(s) no se cumplen: {', '.join(fallidos)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Implementación de referencia del dashboard: un recorrido en Python puro por función,
+tal como estaba antes del motor vectorizado de nucleo_reservas (calcular_analitica). Se usa
+en bench_analitica.py para comparar tiempos y verificar que los resultados coinciden.
+
+También están la lectura de la hoja y la búsqueda de horarios como eran antes del modelo
+Reserva y del índice por fecha: bench_regresion.py las mide en la misma ejecución que las
+actuales y compara la razón entre ambas, que no depende de la máquina.
+"""
+import collections
+from datetime import date, datetime
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from nucleo_reservas.config import obtener_hora_local, sala_principal
+from nucleo_reservas.modelo import COLUMNAS_RESERVA, SIN_HORA, minutes_to_time
+
+def calcular_metricas(reservas):
+    if not reservas:
+        return {
+            'total_reservas': 0,
+            'reservas_mes_actual': 0,
+            'tasa_ocupacion': 0,
+            'promedio_asistentes': 0,
+            'reuniones_por_prioridad': {}
+        }
+
+    hoy = obtener_hora_local() # <-- Cambiado a hora local
+    mes_actual = hoy.month
+
+    # Filtrar solo reservas que tienen una clave 'fecha' válida
+    reservas_con_fecha = [r for r in reservas if r.fecha]
+
+    # El mes se obtiene una vez por día distinto (Reserva.dia), no una vez por reserva
+    conteo_por_dia = collections.Counter(r.dia for r in reservas_con_fecha if r.dia is not None)
+    total_mes = sum(n for dia, n in conteo_por_dia.items() if date.fromordinal(dia).month == mes_actual)
+
+    # Calcular tasa de ocupación (asumiendo 9 horas x 5 días x 4 semanas)
+    horas_totales_mes = 9 * 5 * 4  # 180 horas disponibles
+    horas_reservadas = total_mes * 1.5  # cada reunión dura 1.5 horas
+    tasa_ocupacion = (horas_reservadas / horas_totales_mes) * 100 if horas_totales_mes > 0 else 0
+
+    # Promedio de asistentes
+    total_asistentes = sum(r.num_asistentes for r in reservas_con_fecha)
+    promedio_asistentes = total_asistentes / len(reservas_con_fecha) if reservas_con_fecha else 0
+
+    # Reuniones por prioridad
+    reuniones_por_prioridad = dict(collections.Counter(r.criterio for r in reservas_con_fecha))
+
+    return {
+        'total_reservas': len(reservas_con_fecha), # Contar solo las que tienen fecha
+        'reservas_mes_actual': total_mes,
+        'tasa_ocupacion': round(tasa_ocupacion, 1),
+        'promedio_asistentes': round(promedio_asistentes, 1),
+        'reuniones_por_prioridad': reuniones_por_prioridad
+    }
+
+def crear_grafico_ocupacion_semanal(reservas):
+    if not reservas:
+        fig = go.Figure()
+        fig.add_annotation(text="No hay datos disponibles", showarrow=False, font_size=16)
+        return fig
+
+    # Agrupar por día de la semana, solo con fechas válidas
+    dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+    conteo_dias = {dia: 0 for dia in dias_semana}
+    for r in reservas:
+        if r.dia is not None:
+            dia_semana = (r.dia + 6) % 7 # Igual a date.fromordinal(dia).weekday(): el ordinal 1 es lunes
+            if dia_semana < 5:
+                conteo_dias[dias_semana[dia_semana]] += 1
+
+    fig = go.Figure(data=[
+        go.Bar(
+            x=list(conteo_dias.keys()),
+            y=list(conteo_dias.values()),
+            marker_color=['#667eea', '#764ba2', '#f093fb', '#4facfe', '#43e97b'],
+            text=list(conteo_dias.values()),
+            textposition='outside'
+        )
+    ])
+
+    fig.update_layout(
+        title="Distribución de Reuniones por Día de la Semana",
+        xaxis_title="Día",
+        yaxis_title="Número de Reuniones",
+        height=350,
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Inter, sans-serif")
+    )
+    return fig
+
+def crear_grafico_tendencia_mensual(reservas):
+    if not reservas:
+        fig = go.Figure()
+        fig.add_annotation(text="No hay datos disponibles", showarrow=False, font_size=16)
+        return fig
+
+    # Agrupar por mes, solo con fechas válidas
+    reservas_por_mes = {}
+    for dia, n in collections.Counter(r.dia for r in reservas if r.dia is not None).items():
+        fecha = date.fromordinal(dia)
+        mes_año = f"{fecha.year:04d}-{fecha.month:02d}"
+        reservas_por_mes[mes_año] = reservas_por_mes.get(mes_año, 0) + n
+
+    meses = sorted(reservas_por_mes.keys())
+    valores = [reservas_por_mes[m] for m in meses]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=meses,
+        y=valores,
+        mode='lines+markers',
+        name='Reservas',
+        line=dict(color='#667eea', width=3),
+        marker=dict(size=10, color='#764ba2'),
+        fill='tozeroy',
+        fillcolor='rgba(102, 126, 234, 0.1)'
+    ))
+
+    fig.update_layout(
+        title="Tendencia de Reservas Mensuales",
+        xaxis_title="Mes",
+        yaxis_title="Número de Reservas",
+        height=350,
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Inter, sans-serif")
+    )
+    return fig
+
+def crear_mapa_calor_horarios(reservas):
+    if not reservas:
+        fig = go.Figure()
+        fig.add_annotation(text="No hay datos disponibles", showarrow=False, font_size=16)
+        return fig
+
+    dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+    horas = [f"{h:02d}:00" for h in range(8, 17)]
+    matriz = [[0 for _ in range(len(horas))] for _ in range(len(dias))]
+
+    for r in reservas:
+        if r.dia is not None and r.inicio != SIN_HORA:
+            dia_idx = (r.dia + 6) % 7
+            hora_inicio = r.inicio // 60
+            if dia_idx < 5 and 8 <= hora_inicio < 17:
+                matriz[dia_idx][hora_inicio - 8] += 1
+
+    fig = go.Figure(data=go.Heatmap(
+        z=matriz,
+        x=horas,
+        y=dias,
+        colorscale='Purples',
+        text=matriz,
+        texttemplate='%{text}',
+        textfont={"size": 10},
+        colorbar=dict(title="Reuniones")
+    ))
+
+    fig.update_layout(
+        title="Mapa de Calor: Horarios Más Solicitados",
+        xaxis_title="Hora",
+        yaxis_title="Día",
+        height=400,
+        margin=dict(l=20, r=20, t=40, b=20),
+        font=dict(family="Inter, sans-serif")
+    )
+    return fig
+
+def asistentes_por_criterio(reservas):
+    """Cálculo que antes estaba dentro del dashboard para el gráfico de asistentes."""
+    reservas_con_fecha = [r for r in reservas if r.fecha]
+    df_asistentes = pd.DataFrame(reservas_con_fecha)
+    return df_asistentes.groupby('criterio')['num_asistentes'].mean().reset_index()
+
+def cargar_reservas(values):
+    """Parser de cargar_reservas_desde_sheets: una fila cruda por vez, validando la fecha con strptime."""
+    if not values:
+        return []
+    headers = values[0]
+    if headers != COLUMNAS_RESERVA[:len(headers)]:
+        return []
+
+    reservas = []
+    for i, row in enumerate(values[1:], start=2):
+        if len(row) < len(headers) - 2: # Sin sala ni serie la hoja omite las dos últimas columnas
+            continue
+        reserva_dict = {headers[j]: row[j] if j < len(row) else "" for j in range(len(headers))}
+        try:
+            reserva_dict['num_asistentes'] = int(reserva_dict.get('num_asistentes', 0))
+        except ValueError:
+            reserva_dict['num_asistentes'] = 0
+        fecha_str = reserva_dict.get('fecha', '')
+        if fecha_str:
+            try:
+                datetime.strptime(fecha_str, '%Y-%m-%d')
+            except ValueError:
+                continue
+        reservas.append(reserva_dict)
+    return reservas
+
+def _minutos(hora):
+    t = datetime.strptime(hora, '%H:%M').time()
+    return t.hour * 60 + t.minute
+
+def verificar_solapamiento(inicio1, fin1, inicio2, fin2):
+    return not (_minutos(fin1) <= _minutos(inicio2) or _minutos(fin2) <= _minutos(inicio1))
+
+def encontrar_horarios_disponibles_en_rango(fecha, hora_inicio_rango, hora_fin_rango, reservas_existentes,
+                                            duracion, paso, sala):
+    """Búsqueda lineal: cada horario candidato recorre todas las reservas (con duración y sala)."""
+    horarios_disponibles = []
+    principal = sala_principal()
+    fin_rango_min = _minutos(hora_fin_rango)
+    tiempo_actual = _minutos(hora_inicio_rango)
+    while tiempo_actual + duracion <= fin_rango_min:
+        inicio_propuesto = minutes_to_time(tiempo_actual)
+        fin_propuesto = minutes_to_time(tiempo_actual + duracion)
+
+        disponible = True
+        for reserva in reservas_existentes:
+            if (reserva['fecha'] == fecha and (reserva.get('sala') or principal) == sala and
+                    verificar_solapamiento(inicio_propuesto, fin_propuesto, reserva['hora_inicio'], reserva['hora_fin'])):
+                disponible = False
+                break
+
+        if disponible:
+            horarios_disponibles.append((inicio_propuesto, fin_propuesto))
+        tiempo_actual += paso
+    return horarios_disponibles
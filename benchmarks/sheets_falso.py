@@ -0,0 +1,367 @@
+"""
+Servidor local que imita los endpoints de la API de Google Sheets v4 que usa la aplicación
+(values.get, values.batchGet, values.append, values.batchUpdate, values.update y el addSheet
+de spreadsheets.batchUpdate) sobre una hoja en memoria, para hacer pruebas de carga sin tocar la hoja real ni gastar cuota. Se
+puede simular latencia, errores 429 (por cuota por minuto, como la API, o al azar) y una
+hoja de cualquier tamaño rellenada con datos_sinteticos.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/sheets_falso.py --puerto 8765 --filas 100000 --latencia-ms 150 --tasa-429 0.02
+    RESERVAS_SHEETS_ENDPOINT=http://127.0.0.1:8765 streamlit run reservas2.py
+
+Desde Python:
+    hoja = HojaFalsa(filas_de_hoja(generar_reservas(1000)), latencia=0.1)
+    servidor, url = iniciar_servidor(hoja)
+    servicio = crear_servicio(url) # Cliente googleapiclient apuntando al servidor
+
+GET /falso/estadisticas devuelve las llamadas atendidas y rechazadas por método.
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from nucleo_reservas.modelo import COLUMNAS_RESERVA
+
+from datos_sinteticos import SEMILLA, filas_de_hoja, generar_reservas
+
+NOMBRE_HOJA = 'Hoja 1'
+LECTURAS = ('get', 'batchGet') # El resto de los métodos gasta cuota de escritura
+VENTANA_CUOTA_SEGUNDOS = 60
+
+class ErrorSheets(Exception):
+    """Error que el servidor devuelve con el formato de la API ({'error': {...}})."""
+
+    def __init__(self, codigo, mensaje, estado):
+        super().__init__(mensaje)
+        self.codigo = codigo
+        self.estado = estado
+
+# --- Rangos A1 ---
+_RANGO = re.compile(r"^(?:'((?:[^']|'')+)'|([^'!]+))(?:!(.*))?$")
+_CELDAS = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+def _indice_columna(letras):
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - ord('A') + 1
+    return indice - 1
+
+def _letras_columna(indice):
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+def _rango(texto):
+    """
+    "'Hoja 1'!A6:N" -> (hoja, fila_desde, fila_hasta, columna_desde, columna_hasta), con
+    filas desde 1 y columnas desde 0; None en un extremo abierto.
+    """
+    coincidencia = _RANGO.match(texto)
+    celdas = _CELDAS.match((coincidencia.group(3) or '') if coincidencia else '')
+    if not coincidencia or not celdas:
+        raise ErrorSheets(400, f"Unable to parse range: {texto}", 'INVALID_ARGUMENT')
+    hoja = coincidencia.group(1).replace("''", "'") if coincidencia.group(1) else coincidencia.group(2)
+    columna_desde, fila_desde, columna_hasta, fila_hasta = celdas.groups()
+    if coincidencia.group(3) and ':' not in coincidencia.group(3): # Una sola celda
+        columna_hasta, fila_hasta = columna_desde, fila_desde
+    return (hoja,
+            int(fila_desde) if fila_desde else 1,
+            int(fila_hasta) if fila_hasta else None,
+            _indice_columna(columna_desde) if columna_desde else 0,
+            _indice_columna(columna_hasta) if columna_hasta else None)
+# --- Fin Rangos A1 ---
+
+def _sin_vacias_al_final(fila):
+    """Como responde la API: sin las celdas vacías del final de la fila."""
+    fila = list(fila)
+    while fila and fila[-1] == '':
+        fila.pop()
+    return fila
+
+class HojaFalsa:
+    """
+    Hoja en memoria (lista de filas de texto, la primera con los encabezados) con la
+    latencia y los rechazos configurados. Es segura entre hilos: el servidor atiende cada
+    solicitud en su propio hilo. `pestanas` tiene las filas de cada pestaña por nombre; la
+    de reservas es `filas`.
+    """
+
+    def __init__(self, filas=None, nombre=NOMBRE_HOJA, latencia=0.0, variacion=0.0, tasa_429=0.0,
+                 lecturas_por_minuto=None, escrituras_por_minuto=None, semilla=None):
+        self.filas = [list(fila) for fila in filas] if filas is not None else [list(COLUMNAS_RESERVA)]
+        self.nombre = nombre
+        self.pestanas = {nombre: self.filas}
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tasa_429 = tasa_429
+        self.cuotas = {'lectura': lecturas_por_minuto, 'escritura': escrituras_por_minuto}
+        self.llamadas = collections.Counter()
+        self.rechazadas = collections.Counter()
+        self._recientes = {'lectura': collections.deque(), 'escritura': collections.deque()}
+        self._azar = random.Random(semilla)
+        self._fallas = collections.defaultdict(collections.deque) # método -> [(código, aplicar), ...]
+        self._lock = threading.Lock()
+
+    def estadisticas(self):
+        with self._lock:
+            return {'filas': len(self.filas), 'llamadas': dict(self.llamadas), 'rechazadas': dict(self.rechazadas)}
+
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self.llamadas.clear()
+            self.rechazadas.clear()
+
+    def fallar(self, metodo, codigo=503, aplicar=False, veces=1):
+        """
+        Las próximas `veces` llamadas a `metodo` responden con el error `codigo`. Con `aplicar`
+        la operación se ejecuta igual, como cuando la respuesta se pierde después de escribir.
+        """
+        with self._lock:
+            self._fallas[metodo].extend([(codigo, aplicar)] * veces)
+
+    def atender(self, metodo, operacion):
+        """Aplica latencia y cuota a una llamada y, si se admite, ejecuta `operacion()`."""
+        with self._lock:
+            demora = max(0.0, self.latencia + self._azar.uniform(-self.variacion, self.variacion))
+            tipo = 'lectura' if metodo in LECTURAS else 'escritura'
+            ahora = time.monotonic()
+            recientes = self._recientes[tipo]
+            while recientes and ahora - recientes[0] >= VENTANA_CUOTA_SEGUNDOS:
+                recientes.popleft()
+            cuota = self.cuotas[tipo]
+            if (cuota is not None and len(recientes) >= cuota) or self._azar.random() < self.tasa_429:
+                self.rechazadas[metodo] += 1
+                admitida = False
+            else:
+                recientes.append(ahora)
+                self.llamadas[metodo] += 1
+                admitida = True
+        if demora:
+            time.sleep(demora)
+        if not admitida:
+            raise ErrorSheets(429, f"Quota exceeded for quota metric '{tipo}' requests per minute per user",
+                              'RESOURCE_EXHAUSTED')
+        with self._lock:
+            codigo, aplicar = self._fallas[metodo].popleft() if self._fallas[metodo] else (None, False)
+            if codigo is None or aplicar:
+                respuesta = operacion()
+            if codigo is None:
+                return respuesta
+        raise ErrorSheets(codigo, f"Falla simulada de {metodo}", 'INTERNAL' if codigo >= 500 else 'FAILED_PRECONDITION')
+
+    # --- Operaciones (llamadas con el candado tomado) ---
+    def _ubicar(self, texto):
+        """(nombre de la pestaña, sus filas, fila_desde, fila_hasta, columna_desde, columna_hasta)."""
+        hoja, fila_desde, fila_hasta, columna_desde, columna_hasta = _rango(texto)
+        if hoja not in self.pestanas:
+            raise ErrorSheets(400, f"Unable to parse range: {texto}", 'INVALID_ARGUMENT')
+        return hoja, self.pestanas[hoja], fila_desde, fila_hasta, columna_desde, columna_hasta
+
+    def _texto_rango(self, hoja, fila_desde, fila_hasta, columna_desde, columna_hasta):
+        return (f"'{hoja}'!{_letras_columna(columna_desde)}{fila_desde}:"
+                f"{_letras_columna(columna_hasta)}{fila_hasta}")
+
+    def agregar_pestana(self, nombre):
+        """addSheet: una pestaña vacía; 400 si ya hay una con ese nombre, como la API."""
+        if nombre in self.pestanas:
+            raise ErrorSheets(400, f'Invalid requests[0].addSheet: A sheet with the name "{nombre}" already '
+                                   f'exists. Please enter another name.', 'INVALID_ARGUMENT')
+        self.pestanas[nombre] = []
+        return {'addSheet': {'properties': {'sheetId': len(self.pestanas) - 1, 'title': nombre}}}
+
+    def leer(self, texto):
+        """values.get: sin celdas vacías al final de cada fila ni filas vacías al final."""
+        hoja, filas, fila_desde, fila_hasta, columna_desde, columna_hasta = self._ubicar(texto)
+        fin_columna = None if columna_hasta is None else columna_hasta + 1
+        valores = []
+        for fila in filas[fila_desde - 1:fila_hasta]:
+            valores.append(_sin_vacias_al_final(fila[columna_desde:fin_columna]))
+        while valores and not valores[-1]:
+            valores.pop()
+        respuesta = {'range': texto, 'majorDimension': 'ROWS'}
+        if valores:
+            ultima_columna = max(len(fila) for fila in valores) + columna_desde - 1
+            respuesta['range'] = self._texto_rango(hoja, fila_desde, fila_desde + len(valores) - 1, columna_desde,
+                                                   columna_hasta if columna_hasta is not None else ultima_columna)
+            respuesta['values'] = valores
+        return respuesta
+
+    def escribir(self, texto, valores, incluir_valores=False):
+        """values.update (y cada rango de batchUpdate): escribe desde la esquina del rango."""
+        hoja, filas, fila_desde, _, columna_desde, _ = self._ubicar(texto)
+        valores = [['' if v is None else str(v) for v in fila] for fila in valores]
+        for k, fila_nueva in enumerate(valores):
+            while len(filas) < fila_desde + k:
+                filas.append([])
+            fila = filas[fila_desde + k - 1]
+            if len(fila) < columna_desde + len(fila_nueva):
+                fila.extend([''] * (columna_desde + len(fila_nueva) - len(fila)))
+            fila[columna_desde:columna_desde + len(fila_nueva)] = fila_nueva
+        ancho = max((len(fila) for fila in valores), default=1)
+        rango = self._texto_rango(hoja, fila_desde, fila_desde + len(valores) - 1, columna_desde,
+                                  columna_desde + ancho - 1)
+        respuesta = {'updatedRange': rango, 'updatedRows': len(valores), 'updatedColumns': ancho,
+                     'updatedCells': sum(len(fila) for fila in valores)}
+        if incluir_valores:
+            respuesta['updatedData'] = {'range': rango, 'majorDimension': 'ROWS',
+                                        'values': [_sin_vacias_al_final(fila) for fila in valores]}
+        return respuesta
+
+    def agregar(self, texto, valores, incluir_valores=False):
+        """values.append: las filas van después de la última fila con datos."""
+        hoja, filas, _, _, columna_desde, _ = self._ubicar(texto)
+        ultima = len(filas)
+        while ultima and not any(filas[ultima - 1]):
+            ultima -= 1
+        tabla = self._texto_rango(hoja, 1, max(ultima, 1), 0, max((len(f) for f in filas), default=1) - 1)
+        actualizacion = self.escribir(f"'{hoja}'!{_letras_columna(columna_desde)}{ultima + 1}", valores,
+                                      incluir_valores)
+        return {'tableRange': tabla, 'updates': actualizacion}
+    # --- Fin Operaciones ---
+
+class _ManejadorSheets(BaseHTTPRequestHandler):
+    """Traduce las rutas REST de la API a las operaciones de la HojaFalsa del servidor."""
+
+    protocol_version = 'HTTP/1.1' # Conexiones keep-alive, como con la API real
+
+    def log_message(self, formato, *args):
+        pass # Sin una línea por solicitud en la consola
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _cuerpo(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(largo) or b'{}')
+
+    def _atender(self, verbo):
+        hoja = self.server.hoja
+        partes = urlsplit(self.path)
+        consulta = parse_qs(partes.query)
+        incluir = consulta.get('includeValuesInResponse', ['false'])[0] == 'true'
+        try:
+            if partes.path == '/falso/estadisticas' and verbo == 'GET':
+                return self._responder(200, hoja.estadisticas())
+            coincidencia = re.match(r"^/v4/spreadsheets/([^/:]+):batchUpdate$", partes.path)
+            if coincidencia and verbo == 'POST':
+                spreadsheet_id, cuerpo = unquote(coincidencia.group(1)), self._cuerpo()
+                solicitudes = cuerpo.get('requests', [])
+                if any(set(solicitud) != {'addSheet'} for solicitud in solicitudes):
+                    raise ErrorSheets(400, "Solo se admite addSheet en spreadsheets.batchUpdate", 'INVALID_ARGUMENT')
+                respuesta = hoja.atender('spreadsheets.batchUpdate', lambda: {'replies': [
+                    hoja.agregar_pestana(s['addSheet']['properties']['title']) for s in solicitudes]})
+                respuesta['spreadsheetId'] = spreadsheet_id
+                return self._responder(200, respuesta)
+            coincidencia = re.match(r"^/v4/spreadsheets/([^/]+)/values(.*)$", partes.path)
+            if not coincidencia:
+                raise ErrorSheets(404, f"Ruta no soportada: {verbo} {partes.path}", 'NOT_FOUND')
+            spreadsheet_id, resto = unquote(coincidencia.group(1)), unquote(coincidencia.group(2))
+            cuerpo = self._cuerpo() if verbo in ('POST', 'PUT') else {}
+            if verbo == 'GET' and resto == ':batchGet':
+                rangos = consulta.get('ranges', [])
+                respuesta = hoja.atender('batchGet', lambda: {'valueRanges': [hoja.leer(r) for r in rangos]})
+            elif verbo == 'POST' and resto == ':batchUpdate':
+                incluir = bool(cuerpo.get('includeValuesInResponse', False))
+                respuesta = hoja.atender('batchUpdate', lambda: {'responses': [
+                    hoja.escribir(d['range'], d.get('values', []), incluir) for d in cuerpo.get('data', [])]})
+                respuesta['totalUpdatedRows'] = sum(r['updatedRows'] for r in respuesta['responses'])
+                respuesta['totalUpdatedCells'] = sum(r['updatedCells'] for r in respuesta['responses'])
+            elif verbo == 'GET' and resto.startswith('/'):
+                respuesta = hoja.atender('get', lambda: hoja.leer(resto[1:]))
+            elif verbo == 'POST' and resto.startswith('/') and resto.endswith(':append'):
+                rango = resto[1:-len(':append')]
+                respuesta = hoja.atender('append', lambda: hoja.agregar(rango, cuerpo.get('values', []), incluir))
+            elif verbo == 'PUT' and resto.startswith('/'):
+                respuesta = hoja.atender('update', lambda: hoja.escribir(resto[1:], cuerpo.get('values', []), incluir))
+            else:
+                raise ErrorSheets(404, f"Ruta no soportada: {verbo} {partes.path}", 'NOT_FOUND')
+        except ErrorSheets as e:
+            return self._responder(e.codigo, {'error': {'code': e.codigo, 'message': str(e), 'status': e.estado}})
+        respuesta['spreadsheetId'] = spreadsheet_id
+        return self._responder(200, respuesta)
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def do_PUT(self):
+        self._atender('PUT')
+
+def iniciar_servidor(hoja, anfitrion='127.0.0.1', puerto=0):
+    """Atiende `hoja` en un hilo aparte; devuelve (servidor, url). Con puerto 0 se elige uno libre."""
+    servidor = ThreadingHTTPServer((anfitrion, puerto), _ManejadorSheets)
+    servidor.daemon_threads = True
+    servidor.hoja = hoja
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://{anfitrion}:{servidor.server_address[1]}"
+
+def crear_servicio(url, timeout=30):
+    """
+    Cliente googleapiclient de Sheets v4 que habla con el servidor en `url`, sin credenciales.
+    Se puede usar desde varios hilos: httplib2.Http no se comparte, cada hilo usa su conexión.
+    """
+    import httplib2
+    from googleapiclient.discovery import build
+    from googleapiclient.http import HttpRequest
+    conexiones = threading.local()
+
+    class SolicitudPorHilo(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            if http is None:
+                if not hasattr(conexiones, 'http'):
+                    conexiones.http = httplib2.Http(timeout=timeout)
+                http = conexiones.http
+            return super().execute(http=http, num_retries=num_retries)
+
+    return build('sheets', 'v4', http=httplib2.Http(timeout=timeout), requestBuilder=SolicitudPorHilo,
+                 static_discovery=True, cache_discovery=False, client_options={'api_endpoint': url})
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Google Sheets.")
+    parser.add_argument('--anfitrion', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--filas', type=int, default=0, help="reservas sintéticas con que se llena la hoja")
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    parser.add_argument('--latencia-ms', type=float, default=0.0)
+    parser.add_argument('--variacion-ms', type=float, default=0.0, help="la latencia varía ± este valor")
+    parser.add_argument('--tasa-429', type=float, default=0.0, help="fracción de llamadas rechazadas al azar")
+    parser.add_argument('--lecturas-por-minuto', type=int, help="cuota de lectura (sin límite por defecto)")
+    parser.add_argument('--escrituras-por-minuto', type=int, help="cuota de escritura (sin límite por defecto)")
+    args = parser.parse_args(argumentos)
+
+    hoja = HojaFalsa(filas_de_hoja(generar_reservas(args.filas, args.semilla)),
+                     latencia=args.latencia_ms / 1000, variacion=args.variacion_ms / 1000, tasa_429=args.tasa_429,
+                     lecturas_por_minuto=args.lecturas_por_minuto, escrituras_por_minuto=args.escrituras_por_minuto,
+                     semilla=args.semilla)
+    servidor, url = iniciar_servidor(hoja, args.anfitrion, args.puerto)
+    print(f"Hoja falsa '{hoja.nombre}' con {len(hoja.filas) - 1:,} reservas en {url} (Ctrl+C para terminar).")
+    print(f"Para la aplicación: RESERVAS_SHEETS_ENDPOINT={url} streamlit run reservas2.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+        print(f"Estadísticas: {hoja.estadisticas()}")
+
+if __name__ == "__main__":
+    main()
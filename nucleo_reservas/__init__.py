@@ -0,0 +1,53 @@
+"""
+Núcleo del sistema de reservas de salas, sin dependencias de interfaz: no importa
+Streamlit, Plotly ni googleapiclient, así que se puede usar desde scripts, pruebas de
+carga o un servicio. La interfaz (reservas2.py) solo construye el servicio de Sheets,
+registra secrets.toml como fuente de configuración y dibuja.
+
+Módulos:
+    config      zona horaria, criterios, jornada, salas y opciones (leer_config)
+    modelo      columnas, Reserva y conversiones de horas
+    calendario  días hábiles de Chile y plazos de anticipación
+    agenda      ocupación por día y sala, búsqueda y asignación de horarios
+    almacen     Google Sheets / SQLite, planificador de la API e instantánea en disco
+    cache       caché compartida, diario de escrituras y asignación de IDs
+    lote        reservas en lote y series recurrentes
+    analitica   métricas y agregados del dashboard
+
+Los nombres de uso frecuente se pueden importar desde el paquete; el submódulo se carga
+recién al pedirlos (`from nucleo_reservas import Reserva` no importa pandas).
+"""
+import importlib
+
+_MODULOS = {
+    'config': ['CRITERIO_PRIORIDAD', 'DURACION_REUNION_MINUTOS', 'DURACIONES_REUNION', 'HORA_FIN_DIA',
+               'HORA_INICIO_DIA', 'ZONA_HORARIA_LOCAL', 'agregar_fuente_config', 'leer_config',
+               'obtener_granularidad', 'obtener_hora_local', 'obtener_modo_asignacion', 'obtener_salas',
+               'sala_principal'],
+    'modelo': ['COLUMNAS_RESERVA', 'Reserva', 'formatear_duracion', 'minutes_to_time', 'obtener_prioridad',
+               'time_to_minutes', 'verificar_solapamiento'],
+    'calendario': ['CalendarioHabil', 'calcular_horas_habiles', 'calendario_habil', 'es_dia_habil',
+                   'feriados_chile', 'validar_plazo_reserva'],
+    'agenda': ['InstantaneaReservas', 'asignar_optimo', 'encontrar_horarios_disponibles_en_rango',
+               'indice_por_fecha', 'procesar_reserva_con_rango_y_prioridad', 'reubicar_reserva',
+               'salas_candidatas'],
+    'almacen': ['AlmacenGoogleSheets', 'AlmacenReservas', 'AlmacenSQLite', 'PlanificadorSolicitudes',
+                'filtrar_reservas'],
+    'cache': ['AsignadorIds', 'CacheReservas', 'DiarioReservas', 'HorarioOcupado', 'IdEnUso'],
+    'lote': ['expandir_recurrencia', 'leer_solicitudes_csv', 'reservar_en_lote', 'reservar_serie'],
+    'analitica': ['calcular_analitica', 'calcular_metricas', 'tabla_reservas'],
+}
+_ORIGEN = {nombre: modulo for modulo, nombres in _MODULOS.items() for nombre in nombres}
+
+__all__ = sorted(_ORIGEN)
+
+def __getattr__(nombre):
+    modulo = _ORIGEN.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(importlib.import_module(f".{modulo}", __name__), nombre)
+    globals()[nombre] = valor # Las siguientes búsquedas no pasan por __getattr__
+    return valor
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,485 @@
+"""
+Agenda de salas: ocupación de cada día en máscaras de bits, índice por fecha y sala,
+búsqueda de horarios libres y asignación con reubicación de reuniones de menor prioridad.
+"""
+import time as reloj # `time` es datetime.time en este paquete
+from datetime import datetime
+
+from .config import (DURACION_REUNION_MINUTOS, HORA_FIN_DIA, HORA_INICIO_DIA, obtener_granularidad,
+                     obtener_hora_local, obtener_modo_asignacion, obtener_salas, sala_principal)
+from .modelo import SIN_HORA, Reserva, _intervalo, minutes_to_time, time_to_minutes, verificar_solapamiento
+
+# --- Ocupación del día en máscaras de bits ---
+# Un día es un entero de 1440 bits: el bit m está encendido si el minuto m (desde medianoche)
+# está ocupado. Buscar un tramo libre de cualquier duración cuesta unas pocas operaciones
+# sobre enteros, sin recorrer los horarios candidatos uno a uno.
+MINUTOS_DIA = 24 * 60
+_MASCARAS_PASO = {}
+
+def _mascara_minutos(desde, hasta):
+    """Máscara con los minutos [desde, hasta) encendidos, recortada al día."""
+    desde, hasta = max(desde, 0), min(hasta, MINUTOS_DIA)
+    if hasta <= desde:
+        return 0
+    return ((1 << (hasta - desde)) - 1) << desde
+
+def _mascara_paso(desde, paso):
+    """Máscara con los minutos desde, desde + paso, desde + 2*paso, ... del día encendidos."""
+    mascara = _MASCARAS_PASO.get((desde, paso))
+    if mascara is None:
+        primero = desde if desde >= 0 else desde % paso
+        mascara = _MASCARAS_PASO[(desde, paso)] = sum(1 << m for m in range(primero, MINUTOS_DIA, paso))
+    return mascara
+
+def _inicios_de_tramos_libres(libres, duracion):
+    """
+    Máscara de los minutos m tales que m .. m + duracion - 1 están todos en `libres`.
+    Se duplica el largo cubierto en cada paso: O(log duracion) operaciones.
+    """
+    largo = 1
+    while largo < duracion:
+        salto = min(largo, duracion - largo)
+        libres &= libres >> salto
+        largo += salto
+    return libres
+
+def _bits_encendidos(mascara):
+    """Posiciones de los bits encendidos, de menor a mayor."""
+    posiciones = []
+    while mascara:
+        bit = mascara & -mascara
+        posiciones.append(bit.bit_length() - 1)
+        mascara ^= bit
+    return posiciones
+# --- Fin Ocupación del día en máscaras de bits ---
+
+class IndiceReservasPorFecha:
+    """
+    Reservas agrupadas por fecha ('YYYY-MM-DD') y, dentro de cada fecha, por sala (las
+    reservas sin sala cuentan en la sala principal). Para cada fecha y sala entrega,
+    calculada a pedido y guardada, la ocupación del día como máscara de bits, de modo que
+    la disponibilidad depende solo de las k reservas de esa sala ese día: O(k) para armar
+    la máscara y un costo casi constante por búsqueda, sea cual sea la duración o el paso.
+    Con `sala=None` los métodos consideran todas las salas de la fecha.
+    """
+
+    def __init__(self, reservas):
+        principal = sala_principal()
+        self._por_fecha = {}
+        for reserva in reservas:
+            por_sala = self._por_fecha.setdefault(reserva['fecha'], {})
+            por_sala.setdefault(reserva.get('sala') or principal, []).append(reserva)
+        self._ocupacion = {}
+
+    def reservas_del_dia(self, fecha, sala=None):
+        por_sala = self._por_fecha.get(fecha, {})
+        if sala is None:
+            return [r for reservas in por_sala.values() for r in reservas]
+        return por_sala.get(sala, [])
+
+    def reservas_fuera_de(self, fecha, sala=None):
+        """Todas las reservas salvo las de `fecha` (solo las de `sala`, si se indica)."""
+        return [r for otra, por_sala in self._por_fecha.items() for nombre, reservas in por_sala.items()
+                if otra != fecha or (sala is not None and nombre != sala) for r in reservas]
+
+    def ocupacion(self, fecha, sala=None):
+        """Minutos ocupados de la fecha en la sala (bit m = minuto m del día)."""
+        mascara = self._ocupacion.get((fecha, sala))
+        if mascara is None:
+            mascara = 0
+            for inicio, fin in map(_intervalo, self.reservas_del_dia(fecha, sala)):
+                # Se descartan las horas vacías o inválidas (SIN_HORA) y las que no avanzan
+                if SIN_HORA < inicio < fin:
+                    mascara |= _mascara_minutos(inicio, fin)
+            self._ocupacion[(fecha, sala)] = mascara
+        return mascara
+
+    def horarios_libres(self, fecha, desde, hasta, duracion, paso, sala=None):
+        """
+        Inicios (en minutos, de menor a mayor) de los tramos libres de `duracion` minutos
+        contenidos en [desde, hasta) que empiezan en desde, desde + paso, desde + 2*paso, ...
+        """
+        libres = _mascara_minutos(desde, hasta) & ~self.ocupacion(fecha, sala)
+        return _bits_encendidos(_inicios_de_tramos_libres(libres, duracion) & _mascara_paso(desde, paso))
+
+class InstantaneaReservas(tuple):
+    """
+    Tupla inmutable de reservas publicada por la caché, con su IndiceReservasPorFecha
+    construido la primera vez que se pide (una vez por versión, compartido por las sesiones).
+    """
+
+    @property
+    def por_fecha(self):
+        indice = self.__dict__.get('_indice')
+        if indice is None:
+            indice = self.__dict__['_indice'] = IndiceReservasPorFecha(self)
+        return indice
+
+def indice_por_fecha(reservas):
+    """Índice por fecha de `reservas`: el de la instantánea si lo tiene, o uno nuevo."""
+    if isinstance(reservas, IndiceReservasPorFecha):
+        return reservas
+    if isinstance(reservas, InstantaneaReservas):
+        return reservas.por_fecha
+    return IndiceReservasPorFecha(reservas)
+
+def primer_solape(reservas_existentes, lote):
+    """
+    Primer choque del `lote` ([(reserva, reubicadas), ...], ya con sus horarios asignados) con
+    `reservas_existentes`: (reserva del lote o reubicada, reserva con que se cruza) en la misma
+    fecha y sala, o None si no hay ninguno. Solo cuentan los cruces en que participa un
+    horario nuevo del lote; los solapes que ya estaban guardados no se revisan.
+    """
+    principal = sala_principal()
+    indice = indice_por_fecha(reservas_existentes)
+    por_fecha = {} # fecha -> {id: reserva con su horario final}
+    nuevos = set() # ids cuyo horario viene del lote
+    for reserva, reubicadas in lote:
+        for r in list(reubicadas) + [reserva]:
+            del_dia = por_fecha.get(r['fecha'])
+            if del_dia is None:
+                del_dia = por_fecha[r['fecha']] = {x['id']: x for x in indice.reservas_del_dia(r['fecha'])}
+            del_dia[r['id']] = r
+            nuevos.add(r['id'])
+    for del_dia in por_fecha.values():
+        por_sala = {}
+        for r in del_dia.values():
+            inicio, fin = _intervalo(r)
+            if SIN_HORA < inicio < fin:
+                por_sala.setdefault(r.get('sala') or principal, []).append((inicio, fin, r))
+        for intervalos in por_sala.values():
+            intervalos.sort(key=lambda intervalo: intervalo[:2])
+            for i, (_, fin, r) in enumerate(intervalos):
+                for inicio_otra, _, otra in intervalos[i + 1:]:
+                    if inicio_otra >= fin:
+                        break
+                    if r['id'] in nuevos or otra['id'] in nuevos:
+                        return (r, otra) if r['id'] in nuevos else (otra, r)
+    return None
+
+def encontrar_horarios_disponibles_en_rango(fecha, hora_inicio_rango, hora_fin_rango, reservas_existentes,
+                                            duracion=DURACION_REUNION_MINUTOS, paso=None, sala=None):
+    """
+    Horarios (inicio, fin) de `duracion` minutos libres dentro del rango, cada `paso` minutos
+    (por defecto la granularidad configurada). `reservas_existentes` puede ser una lista de
+    reservas, la instantánea de la caché o un IndiceReservasPorFecha; solo se consulta la
+    ocupación de `fecha` en `sala` (en todas las reservas de la fecha si es None).
+    """
+    inicio_rango_min = time_to_minutes(hora_inicio_rango)
+    fin_rango_min = time_to_minutes(hora_fin_rango)
+    indice = indice_por_fecha(reservas_existentes)
+    inicios = indice.horarios_libres(fecha, inicio_rango_min, fin_rango_min, duracion,
+                                     paso or obtener_granularidad(), sala)
+    return [(minutes_to_time(inicio), minutes_to_time(inicio + duracion)) for inicio in inicios]
+
+def reubicar_reserva(reserva_a_reubicar, reservas_fijas, fecha):
+    fecha_solicitud_reserva = datetime.strptime(reserva_a_reubicar['fecha_reserva'], '%Y-%m-%d %H:%M:%S')
+    # Usar la hora local para la comparación de fechas
+    fecha_actual = obtener_hora_local()
+
+    if fecha_solicitud_reserva.date() != fecha_actual.date():
+        return False, None
+
+    # La reunión reubicada conserva su duración
+    horarios_disponibles = encontrar_horarios_disponibles_en_rango(
+        fecha, HORA_INICIO_DIA, HORA_FIN_DIA, reservas_fijas, Reserva(reserva_a_reubicar).duracion
+    )
+
+    if horarios_disponibles:
+        nuevo_inicio, nuevo_fin = horarios_disponibles[0]
+        reserva_a_reubicar['hora_inicio'] = nuevo_inicio
+        reserva_a_reubicar['hora_fin'] = nuevo_fin
+        return True, reserva_a_reubicar
+
+    return False, None
+
+def salas_candidatas(num_asistentes, sala_preferida=''):
+    """
+    Salas con capacidad para `num_asistentes`, de la más chica a la más grande (la de mejor
+    ajuste primero); solo `sala_preferida` si se indica una.
+    """
+    salas = obtener_salas()
+    try:
+        num_asistentes = int(num_asistentes)
+    except (TypeError, ValueError):
+        num_asistentes = 0
+    if sala_preferida:
+        return [sala_preferida] if salas.get(sala_preferida, 0) >= num_asistentes else []
+    return sorted((sala for sala, capacidad in salas.items() if capacidad >= num_asistentes), key=salas.get)
+
+def procesar_reserva_con_rango_y_prioridad(nueva_reserva, reservas_existentes, duracion=DURACION_REUNION_MINUTOS,
+                                           modo=None, avisos=None):
+    """
+    Asigna sala y horario a `nueva_reserva` entre las salas con capacidad para sus
+    asistentes (o en la sala que ya trae). Primero busca un horario libre dentro del rango
+    preferido en todas las salas, de la más ajustada a la más grande; si no hay, prueba sala
+    por sala en el mismo orden un horario cercano al rango o desplazando reuniones de menor
+    prioridad, con asignar_optimo o con la búsqueda voraz según `modo` ('optimo' o 'voraz';
+    por defecto el configurado). Devuelve (exito, reservas_actualizadas, (inicio, fin), reubicadas).
+    Si se entrega la lista `avisos`, se le agregan los avisos para quien reserva (por ejemplo,
+    que la reubicación óptima agotó su presupuesto); la interfaz decide cómo mostrarlos.
+    """
+    # Se trabaja con Reserva (minutos y prioridad ya calculados)
+    if not isinstance(nueva_reserva, Reserva):
+        # Diccionario: se procesa como Reserva y se le copian la sala y el horario asignados
+        reserva = Reserva(nueva_reserva)
+        resultado = procesar_reserva_con_rango_y_prioridad(reserva, reservas_existentes, duracion, modo, avisos)
+        nueva_reserva['hora_inicio'], nueva_reserva['hora_fin'] = reserva['hora_inicio'], reserva['hora_fin']
+        nueva_reserva['sala'] = reserva['sala']
+        return resultado
+    fecha = nueva_reserva['fecha']
+    hora_inicio_rango = time_to_minutes(nueva_reserva['hora_inicio_rango'])
+    hora_fin_rango = time_to_minutes(nueva_reserva['hora_fin_rango'])
+
+    # El índice por fecha y sala de la instantánea se comparte: esta pasada no copia reservas
+    indice = indice_por_fecha(reservas_existentes)
+    salas = salas_candidatas(nueva_reserva['num_asistentes'], nueva_reserva['sala'])
+
+    for sala in salas:
+        horarios_disponibles = encontrar_horarios_disponibles_en_rango(
+            fecha, hora_inicio_rango, hora_fin_rango, indice, duracion, sala=sala
+        )
+        if horarios_disponibles:
+            inicio_asignado, fin_asignado = horarios_disponibles[0]
+            nueva_reserva['sala'] = sala
+            nueva_reserva['hora_inicio'] = inicio_asignado
+            nueva_reserva['hora_fin'] = fin_asignado
+            return True, list(reservas_existentes) + [nueva_reserva], (inicio_asignado, fin_asignado), []
+
+    modo_configurado, presupuesto = obtener_modo_asignacion()
+    modo = modo or modo_configurado
+    for sala in salas:
+        # Solo intervienen las reservas de la sala ese día; se copian porque la reubicación
+        # modifica sus horarios
+        reservas_sala = [Reserva(r) for r in indice.reservas_del_dia(fecha, sala)]
+        if modo == 'voraz':
+            exito, reservas_sala, horario_asignado, reubicadas = _asignar_con_prioridad(
+                nueva_reserva, reservas_sala, fecha, hora_inicio_rango, hora_fin_rango, duracion
+            )
+        else:
+            exito, reservas_sala, horario_asignado, reubicadas, agotado = asignar_optimo(
+                nueva_reserva, reservas_sala, hora_inicio_rango, hora_fin_rango, duracion, presupuesto
+            )
+            if agotado and avisos is not None:
+                avisos.append(f"Se agotó el presupuesto de {presupuesto * 1000:.0f} ms al reubicar reuniones en "
+                              f"{sala}; se usó la mejor solución encontrada, que puede mover más reuniones de "
+                              f"lo necesario.")
+        if exito:
+            nueva_reserva['sala'] = sala
+            return True, indice.reservas_fuera_de(fecha, sala) + reservas_sala, horario_asignado, reubicadas
+
+    return False, reservas_existentes, None, []
+
+def _asignar_con_prioridad(nueva_reserva, reservas_temporales, fecha, hora_inicio_rango, hora_fin_rango, duracion):
+    """
+    Asignación en una sala sin horario libre dentro del rango: un horario del día que toque
+    el rango o, si el rango tiene reuniones, desplazando las de menor prioridad solicitadas
+    hoy. `reservas_temporales` son copias de las reservas de la sala ese día. Devuelve
+    (exito, reservas de la sala ese día ya actualizadas, (inicio, fin), reubicadas).
+    """
+    prioridad_nueva = nueva_reserva.prioridad
+
+    conflictos_en_rango = []
+    for reserva_existente in reservas_temporales:
+        if verificar_solapamiento(hora_inicio_rango, hora_fin_rango,
+                                  reserva_existente.inicio, reserva_existente.fin):
+            conflictos_en_rango.append(reserva_existente)
+
+    if not conflictos_en_rango:
+        todos_horarios_dia = encontrar_horarios_disponibles_en_rango(
+            fecha, HORA_INICIO_DIA, HORA_FIN_DIA, reservas_temporales, duracion
+        )
+        horarios_en_rango = []
+        for inicio, fin in todos_horarios_dia:
+            if verificar_solapamiento(inicio, fin, hora_inicio_rango, hora_fin_rango):
+                horarios_en_rango.append((inicio, fin))
+
+        if horarios_en_rango:
+            inicio_asignado, fin_asignado = horarios_en_rango[0]
+            nueva_reserva['hora_inicio'] = inicio_asignado
+            nueva_reserva['hora_fin'] = fin_asignado
+            return True, reservas_temporales + [nueva_reserva], (inicio_asignado, fin_asignado), []
+        else:
+            return False, None, None, []
+
+    conflictos_ordenados = sorted(conflictos_en_rango, key=lambda x: x.prioridad)
+
+    reservas_a_desplazar = []
+    reservas_fijas = []
+
+    for conflicto in conflictos_ordenados:
+        prioridad_conflicto = conflicto.prioridad
+        if prioridad_nueva < prioridad_conflicto:
+            fecha_solicitud_conflicto = datetime.strptime(conflicto['fecha_reserva'], '%Y-%m-%d %H:%M:%S')
+            # Usar la hora local para la comparación de fechas
+            fecha_actual = obtener_hora_local()
+            if fecha_solicitud_conflicto.date() == fecha_actual.date():
+                reservas_a_desplazar.append(conflicto)
+            else:
+                reservas_fijas.append(conflicto)
+        elif prioridad_nueva == prioridad_conflicto:
+            reservas_fijas.append(conflicto)
+        else:
+            reservas_fijas.append(conflicto)
+
+    # Por identidad: comparar reservas completas contra cada desplazada era O(n²)
+    desplazadas = {id(r) for r in reservas_a_desplazar}
+    todas_reservas_fijas = [r for r in reservas_temporales if id(r) not in desplazadas]
+
+    horarios_con_fijas = encontrar_horarios_disponibles_en_rango(
+        fecha, HORA_INICIO_DIA, HORA_FIN_DIA, todas_reservas_fijas, duracion
+    )
+
+    horarios_validos = []
+    for inicio, fin in horarios_con_fijas:
+        if verificar_solapamiento(inicio, fin, hora_inicio_rango, hora_fin_rango):
+            horarios_validos.append((inicio, fin))
+
+    if not horarios_validos:
+        return False, None, None, []
+
+    inicio_nuevo, fin_nuevo = horarios_validos[0]
+    nueva_reserva['hora_inicio'] = inicio_nuevo
+    nueva_reserva['hora_fin'] = fin_nuevo
+
+    reservas_reubicadas_exitosamente = []
+    reservas_fallidas = []
+
+    for reserva_desplazar in reservas_a_desplazar:
+        # Las ya reubicadas también ocupan su nuevo horario
+        exito, nueva_reserva_desplazada = reubicar_reserva(
+            reserva_desplazar,
+            todas_reservas_fijas + [nueva_reserva] + reservas_reubicadas_exitosamente,
+            fecha
+        )
+        if exito:
+            reservas_reubicadas_exitosamente.append(nueva_reserva_desplazada)
+        else:
+            reservas_fallidas.append(reserva_desplazar)
+
+    if reservas_fallidas:
+        return False, None, None, []
+
+    reservas_finales = todas_reservas_fijas + [nueva_reserva] + reservas_reubicadas_exitosamente
+    return True, reservas_finales, (inicio_nuevo, fin_nuevo), reservas_reubicadas_exitosamente
+
+# --- Reubicación óptima ---
+def _solicitada_el(reserva, dia):
+    """True si la reserva se solicitó el día `dia` (fecha_reserva 'YYYY-MM-DD HH:MM:SS')."""
+    return str(reserva['fecha_reserva']).startswith(dia.isoformat())
+
+def asignar_optimo(nueva_reserva, reservas_temporales, hora_inicio_rango, hora_fin_rango, duracion, presupuesto):
+    """
+    Asignación en una sala sin horario libre dentro del rango, buscando entre todas las
+    combinaciones en vez de tomar el primer horario de cada reunión. La nueva reunión va en
+    un horario dentro del rango o que lo toque; las que estorban y se pueden mover (menor
+    prioridad, solicitadas hoy, como en la búsqueda voraz) se reubican en el día, y si al
+    reubicarse tapan otra reunión movible esta también se reubica. Entre las soluciones
+    factibles se elige la que mueve menos reuniones y, a igual número, la que las mueve
+    menos minutos en total; a igual costo, el primer horario de la nueva en el orden de la
+    búsqueda voraz. Es una búsqueda en profundidad con poda por costo: si se agota
+    `presupuesto` (segundos) se usa la mejor solución encontrada hasta ese momento.
+    `reservas_temporales` son copias de las reservas de la sala ese día. Devuelve
+    (exito, reservas de la sala ese día ya actualizadas, (inicio, fin), reubicadas, agotado),
+    con `agotado` True si se cortó la búsqueda por el presupuesto (la solución puede no ser
+    la mejor).
+    """
+    paso = obtener_granularidad()
+    inicio_dia, fin_dia = time_to_minutes(HORA_INICIO_DIA), time_to_minutes(HORA_FIN_DIA)
+    hoy = obtener_hora_local().date()
+
+    fijas = 0
+    movibles = [] # (reserva, máscara de su horario actual)
+    for reserva in reservas_temporales:
+        if not SIN_HORA < reserva.inicio < reserva.fin:
+            continue
+        mascara = _mascara_minutos(reserva.inicio, reserva.fin)
+        if reserva.prioridad > nueva_reserva.prioridad and _solicitada_el(reserva, hoy):
+            movibles.append((reserva, mascara))
+        else:
+            fijas |= mascara
+
+    # Horarios para la nueva reunión: dentro del rango y luego los del día que tocan el rango
+    candidatos = list(range(hora_inicio_rango, hora_fin_rango - duracion + 1, paso))
+    en_rango = set(candidatos)
+    candidatos += [inicio for inicio in range(inicio_dia, fin_dia - duracion + 1, paso)
+                   if inicio < hora_fin_rango and inicio + duracion > hora_inicio_rango and inicio not in en_rango]
+
+    jornada = _mascara_minutos(inicio_dia, fin_dia)
+    inicios_jornada = _mascara_paso(inicio_dia, paso)
+    limite = reloj.perf_counter() + presupuesto
+    mejor = None # ((movidas, minutos), inicio de la nueva, [(reserva, nuevo inicio), ...])
+    agotado = False
+    colocaciones = []
+    visitados = {} # (ocupado, pendientes) -> menor costo con que se alcanzó
+
+    def colocar(pendientes, ocupado, en_sitio, movidas, distancia, inicio_nueva):
+        nonlocal mejor, agotado
+        if reloj.perf_counter() > limite:
+            agotado = True
+            return
+        if not pendientes:
+            if mejor is None or (movidas, distancia) < mejor[0]:
+                mejor = ((movidas, distancia), inicio_nueva, list(colocaciones))
+            return
+        # Poda: el mismo estado (día ocupado y reuniones por ubicar) ya se alcanzó con igual o menor costo
+        estado = (ocupado, frozenset(map(id, pendientes)), frozenset(id(m[0]) for m in en_sitio))
+        if visitados.get(estado, (movidas + 1,)) <= (movidas, distancia):
+            return
+        visitados[estado] = (movidas, distancia)
+        # Poda: los minutos libres del día no alcanzan para las pendientes y las movibles que siguen
+        # en su lugar, o alguna pendiente ya no cabe en ninguna parte
+        libres = jornada & ~ocupado
+        en_su_lugar = 0
+        for _, mascara in en_sitio:
+            en_su_lugar |= mascara
+        if bin(libres).count('1') < sum(r.fin - r.inicio for r in pendientes) + bin(en_su_lugar & jornada).count('1'):
+            return
+        if any(not _inicios_de_tramos_libres(libres, r.fin - r.inicio) & inicios_jornada for r in pendientes):
+            return
+        reserva, resto = pendientes[0], pendientes[1:]
+        largo = reserva.fin - reserva.inicio
+        # Del horario más cercano al original al más lejano: el primero que no mejora corta el ciclo
+        for inicio in sorted(range(inicio_dia, fin_dia - largo + 1, paso), key=lambda i: abs(i - reserva.inicio)):
+            nueva_distancia = distancia + abs(inicio - reserva.inicio)
+            if mejor is not None and (movidas, nueva_distancia) >= mejor[0]:
+                break
+            mascara = _mascara_minutos(inicio, inicio + largo)
+            if mascara & ocupado:
+                continue
+            tapadas = [m for m in en_sitio if m[1] & mascara]
+            if mejor is not None and (movidas + len(tapadas), nueva_distancia) >= mejor[0]:
+                continue
+            colocaciones.append((reserva, inicio))
+            colocar(resto + [m[0] for m in tapadas], ocupado | mascara,
+                    [m for m in en_sitio if not m[1] & mascara], movidas + len(tapadas), nueva_distancia, inicio_nueva)
+            colocaciones.pop()
+            if agotado:
+                return
+
+    for inicio in candidatos:
+        mascara = _mascara_minutos(inicio, inicio + duracion)
+        if mascara & fijas:
+            continue
+        estorban = sorted((m for m in movibles if m[1] & mascara), key=lambda m: m[0].inicio - m[0].fin)
+        if mejor is not None and (len(estorban), 0) >= mejor[0]:
+            continue
+        colocar([m[0] for m in estorban], fijas | mascara, [m for m in movibles if not m[1] & mascara],
+                len(estorban), 0, inicio)
+        if agotado:
+            break # Se usa la mejor solución encontrada hasta aquí
+
+    if mejor is None:
+        return False, None, None, [], agotado
+
+    _, inicio_nuevo, reubicaciones = mejor
+    horario = (minutes_to_time(inicio_nuevo), minutes_to_time(inicio_nuevo + duracion))
+    nueva_reserva['hora_inicio'], nueva_reserva['hora_fin'] = horario
+    reubicadas = []
+    for reserva, inicio in reubicaciones:
+        largo = reserva.fin - reserva.inicio
+        reserva['hora_inicio'] = minutes_to_time(inicio)
+        reserva['hora_fin'] = minutes_to_time(inicio + largo)
+        reubicadas.append(reserva)
+    return True, reservas_temporales + [nueva_reserva], horario, reubicadas, agotado
+# --- Fin Reubicación óptima ---
@@ -0,0 +1,893 @@
+"""
+Motores de almacenamiento de reservas (Google Sheets y SQLite) con sincronización
+incremental, el planificador de solicitudes a la API de Sheets y la instantánea en disco.
+El servicio de Sheets se recibe ya construido: este módulo no importa googleapiclient.
+"""
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time as reloj # `time` es datetime.time en este paquete
+from contextlib import closing
+from datetime import date, datetime, timedelta
+
+try:
+    # Opcional: sin pyarrow la caché simplemente no guarda instantáneas en disco
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from .modelo import COLUMNAS_ANTERIORES, COLUMNAS_RESERVA, Reserva
+
+# Cuotas de la API de Sheets: 60 solicitudes de lectura y 60 de escritura por minuto por usuario
+LECTURAS_POR_MINUTO = 60
+ESCRITURAS_POR_MINUTO = 60
+MAX_REINTENTOS = 5
+ESPERA_MAXIMA_SEGUNDOS = 32
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+class _CubetaTokens:
+    """Limitador de tasa: `capacidad` solicitudes en ráfaga, reponiendo `por_minuto` cada minuto."""
+
+    def __init__(self, por_minuto, capacidad=None):
+        self.tasa = por_minuto / 60.0
+        self.capacidad = capacidad or por_minuto
+        self.tokens = float(self.capacidad)
+        self._ultimo = reloj.monotonic()
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        """Bloquea hasta que haya un token disponible."""
+        while True:
+            with self._lock:
+                ahora = reloj.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.tasa
+            reloj.sleep(espera)
+
+class _Vuelo:
+    """Solicitud en curso a la que se suman las lecturas idénticas que llegan mientras tanto."""
+
+    def __init__(self):
+        self.terminado = threading.Event()
+        self.resultado = None
+        self.error = None
+
+def _estado_http(error):
+    """Código HTTP de un error de la API (HttpError expone resp.status), o None."""
+    respuesta = getattr(error, 'resp', None)
+    estado = getattr(respuesta, 'status', None) or getattr(error, 'status_code', None)
+    try:
+        return int(estado)
+    except (TypeError, ValueError):
+        return None
+
+class PlanificadorSolicitudes:
+    """
+    Capa por la que pasan todas las llamadas a la API de Sheets:
+    - coalesce las lecturas idénticas concurrentes (misma `clave`) en una sola solicitud,
+    - respeta la cuota por minuto con una cubeta de tokens para lecturas y otra para escrituras,
+    - reintenta con espera exponencial y jitter ante 429/5xx y errores de red.
+    Las escrituras no idempotentes (values.append) solo se reintentan ante 429, que la API
+    rechaza sin aplicar; un 5xx podría haber escrito la fila y reintentar la duplicaría.
+    """
+
+    def __init__(self, lecturas_por_minuto=LECTURAS_POR_MINUTO, escrituras_por_minuto=ESCRITURAS_POR_MINUTO,
+                 max_reintentos=MAX_REINTENTOS, espera_maxima=ESPERA_MAXIMA_SEGUNDOS):
+        self.lecturas = _CubetaTokens(lecturas_por_minuto)
+        self.escrituras = _CubetaTokens(escrituras_por_minuto)
+        self.max_reintentos = max_reintentos
+        self.espera_maxima = espera_maxima
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self.llamadas = 0 # Solicitudes realmente enviadas a la API (sin contar las coalescidas)
+
+    def leer(self, solicitud, clave):
+        """Ejecuta una lectura; si ya hay una en curso con la misma clave, espera su resultado."""
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+        if not lider:
+            vuelo.terminado.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+        try:
+            vuelo.resultado = self._ejecutar(solicitud, self.lecturas, idempotente=True)
+            return vuelo.resultado
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+            vuelo.terminado.set()
+
+    def escribir(self, solicitud, idempotente):
+        return self._ejecutar(solicitud, self.escrituras, idempotente)
+
+    def _ejecutar(self, solicitud, cubeta, idempotente):
+        intento = 0
+        while True:
+            cubeta.tomar()
+            try:
+                self.llamadas += 1
+                return solicitud.execute()
+            except Exception as e:
+                estado = _estado_http(e)
+                reintentable = estado == 429 or (idempotente and (
+                    estado in ESTADOS_REINTENTABLES or (estado is None and isinstance(e, OSError))))
+                if not reintentable or intento >= self.max_reintentos:
+                    raise
+                espera = random.uniform(0.5, 1.0) * min(self.espera_maxima, 2 ** intento)
+                print(f"Sheets respondió {estado or type(e).__name__}; reintento {intento + 1} en {espera:.1f} s.")
+                reloj.sleep(espera)
+                intento += 1
+
+# Cada cuánto tiempo se fuerza una recarga completa aunque la sincronización incremental
+# no haya detectado cambios (una edición en una fila que el tramo rotativo aún no revisó)
+INTERVALO_RECARGA_COMPLETA = timedelta(minutes=30)
+# Filas anteriores a la marca de agua que la sincronización incremental de Sheets relee para
+# detectar ediciones: las últimas (reservas recientes, las que más se corrigen) y un tramo
+# rotativo que recorre el resto de la hoja, de modo que cada fila se revisa cada
+# total_filas / FILAS_VERIFICADAS_ROTATIVAS sincronizaciones
+FILAS_VERIFICADAS_FINALES = 100
+FILAS_VERIFICADAS_ROTATIVAS = 100
+
+def _nuevo_estado_sync():
+    """Estado de sincronización común a todos los motores: reservas cargadas e índices."""
+    return {
+        'filas': {},           # clave de fila -> reserva, solo filas válidas
+        'fila_por_id': {},     # id -> clave de fila, para actualizar filas existentes
+        'max_id_por_fecha': {},# 'YYYYMMDD' -> mayor correlativo de ID visto en el almacén
+        'carga_completa': None # Momento de la última recarga completa
+    }
+
+def _separar_id(id_reserva):
+    """Divide un ID 'RES-YYYYMMDD-NNN' en ('YYYYMMDD', NNN); None si no tiene ese formato."""
+    partes = str(id_reserva).split('-')
+    if len(partes) != 3 or partes[0] != 'RES':
+        return None
+    try:
+        return partes[1], int(partes[2])
+    except ValueError:
+        return None # Si no es un número, lo ignora
+
+def _registrar_id(estado, id_reserva):
+    """Mantiene el índice de correlativos por fecha usado por AsignadorIds."""
+    partes = _separar_id(id_reserva)
+    if partes:
+        fecha_id, numero = partes
+        if numero > estado['max_id_por_fecha'].get(fecha_id, 0):
+            estado['max_id_por_fecha'][fecha_id] = numero
+
+def _registrar_reserva(estado, clave, reserva_dict):
+    """Guarda la reserva en el estado bajo `clave` (como Reserva) y actualiza los índices."""
+    if not isinstance(reserva_dict, Reserva):
+        reserva_dict = Reserva(reserva_dict)
+    estado['filas'][clave] = reserva_dict
+    estado['fila_por_id'][reserva_dict['id']] = clave
+    _registrar_id(estado, reserva_dict['id'])
+
+def _fila_a_reserva(headers, row, i):
+    """Convierte una fila cruda de la hoja en una Reserva (o None si se salta)."""
+    # La hoja omite las celdas vacías al final de la fila: una reserva sin sala ni serie llega sin las columnas M y N
+    minimo = min(len(headers), len(COLUMNAS_ANTERIORES))
+    if len(row) < minimo: # Asegurarse de que la fila tiene suficientes columnas
+        print(f"Fila {i} con datos insuficientes (menos de {minimo} columnas): {row}, saltando fila.")
+        return None
+
+    reserva_dict = {headers[j]: row[j] if j < len(row) else "" for j in range(len(headers))}
+    # Convertir campos numéricos y de fecha/hora si es necesario
+    # Por ejemplo, num_asistentes debe ser int
+    try:
+        reserva_dict['num_asistentes'] = int(reserva_dict.get('num_asistentes', 0))
+    except ValueError:
+        reserva_dict['num_asistentes'] = 0 # Valor por defecto si no es un número
+        print(f"Advertencia: 'num_asistentes' no es un número en la fila {i}, usando 0. Valor: {row}")
+
+    # El ID es string, no lo convertimos a int
+    # Fecha, horas y prioridad se convierten aquí una sola vez (ver Reserva)
+    reserva = Reserva(reserva_dict)
+    if reserva.fecha and reserva.dia is None:
+        print(f"Advertencia: Formato de fecha inválido en la fila {i}: {reserva.fecha}, saltando fila.")
+        return None # Saltar esta fila si la fecha es inválida
+
+    return reserva
+
+def _reserva_a_fila(reserva):
+    """Convierte una reserva en la lista de valores de las columnas A a N."""
+    # El orden debe coincidir con el de las columnas en la hoja (A a N)
+    return [
+        reserva.get('id', ''),
+        reserva.get('nombre', ''),
+        reserva.get('email', ''),
+        reserva.get('fecha', ''),
+        reserva.get('hora_inicio_rango', ''),
+        reserva.get('hora_fin_rango', ''),
+        reserva.get('hora_inicio', ''),
+        reserva.get('hora_fin', ''),
+        reserva.get('criterio', ''),
+        str(reserva.get('num_asistentes', 0)),
+        reserva.get('proposito', ''),
+        reserva.get('fecha_reserva', ''),
+        reserva.get('sala', ''),
+        reserva.get('serie', '')
+        # 'prioridad_num' no se guarda explícitamente en la hoja, se calcula al cargar
+    ]
+
+_COLUMNA_ASISTENTES = COLUMNAS_RESERVA.index('num_asistentes')
+
+def _fila_coincide(reserva, row, headers):
+    """True si la fila cruda `row` tiene los valores con que se cargó `reserva` (ver _fila_a_reserva)."""
+    for j, valor in enumerate(_reserva_a_fila(reserva)[:len(headers)]):
+        crudo = row[j] if j < len(row) else ''
+        if j == _COLUMNA_ASISTENTES:
+            try:
+                crudo = str(int(crudo))
+            except ValueError:
+                crudo = '0' # Como al cargar: un valor que no es número queda en 0
+        if crudo != valor:
+            return False
+    return True
+
+def filtrar_reservas(reservas, fecha_desde, fecha_hasta, criterios=None):
+    """Reservas entre fecha_desde y fecha_hasta (inclusive), opcionalmente de ciertos criterios."""
+    # Comparación de ordinales enteros (Reserva.dia), sin convertir la fecha de cada reserva
+    desde, hasta = fecha_desde.toordinal(), fecha_hasta.toordinal()
+    criterios = set(criterios) if criterios else None
+    seleccionadas = []
+    for reserva in reservas:
+        if reserva.dia is None:
+            if reserva.fecha:
+                print(f"Advertencia: Fecha inválida '{reserva.fecha}' en reserva {reserva.id or 'desconocido'}, ignorando filtro.")
+            continue # Saltar esta reserva si la fecha es inválida
+        if reserva.dia < desde or reserva.dia > hasta:
+            continue
+        if criterios and reserva.criterio not in criterios:
+            continue
+        seleccionadas.append(reserva)
+    return seleccionadas
+
+class AlmacenReservas:
+    """
+    Interfaz común de los motores de almacenamiento. Cada motor sabe sincronizar un
+    estado (ver _nuevo_estado_sync) de forma incremental y escribir reservas nuevas junto
+    con los horarios de las reubicadas. La escritura es en dos pasos: `escribir` hace la
+    operación contra el almacén y devuelve los cambios; `aplicar` los incorpora al estado
+    sin volver a leer (y devuelve True si conviene resincronizar).
+    """
+
+    def nuevo_estado(self):
+        return _nuevo_estado_sync()
+
+    def sincronizar(self, estado):
+        """
+        Actualiza `estado` con el contenido actual del almacén. Usa la sincronización
+        incremental cuando es posible y cae a una recarga completa si no hay marca de agua,
+        si el almacén cambió por encima de ella o si venció INTERVALO_RECARGA_COMPLETA.
+        Devuelve True si el conjunto de reservas cambió.
+        """
+        filas_previas = estado['filas']
+        recarga_vencida = (estado['carga_completa'] is None or
+                           datetime.now() - estado['carga_completa'] > INTERVALO_RECARGA_COMPLETA)
+        if recarga_vencida or not self._sincronizacion_incremental(estado):
+            self._recarga_completa(estado)
+        return estado['filas'] is not filas_previas and estado['filas'] != filas_previas
+
+    def _recarga_completa(self, estado):
+        raise NotImplementedError
+
+    def _sincronizacion_incremental(self, estado):
+        raise NotImplementedError
+
+    def escribir(self, estado, reserva, reubicadas=()):
+        return self.escribir_lote(estado, [reserva], reubicadas)
+
+    def escribir_lote(self, estado, reservas, reubicadas=()):
+        """Como `escribir`, pero con varias reservas nuevas en una sola operación."""
+        raise NotImplementedError
+
+    def aplicar(self, estado, cambios):
+        raise NotImplementedError
+
+    def reservar_correlativos(self, fecha_id, cantidad, minimo=0):
+        """
+        Reserva en el almacén `cantidad` correlativos seguidos de ID para 'YYYYMMDD', todos
+        mayores que `minimo` (el mayor que ya conoce quien pide), y los devuelve en una lista.
+        La reserva es atómica en el almacén: dos servidores nunca reciben el mismo número.
+        """
+        raise NotImplementedError
+
+    def consultar_rango(self, estado, fecha_desde, fecha_hasta, criterios=None):
+        """Consulta por rango de fechas; por defecto filtra las reservas ya cargadas."""
+        return filtrar_reservas(estado['filas'].values(), fecha_desde, fecha_hasta, criterios)
+
+HOJA_CORRELATIVOS = 'IDs reservados' # Pestaña con una fila por correlativo de ID entregado
+
+class AlmacenGoogleSheets(AlmacenReservas):
+    """
+    Reservas en una hoja de Google Sheets; la clave de cada reserva es su número de fila.
+    Todas las llamadas pasan por `planificador` (PlanificadorSolicitudes). Los correlativos
+    de ID se reservan en la pestaña `hoja_correlativos`, que se crea la primera vez y no se
+    debe editar a mano.
+    """
+
+    def __init__(self, servicio, spreadsheet_id, hoja, planificador=None, hoja_correlativos=HOJA_CORRELATIVOS):
+        self.servicio = servicio
+        self.spreadsheet_id = spreadsheet_id
+        self.hoja = hoja
+        self.planificador = planificador or PlanificadorSolicitudes()
+        self.hoja_correlativos = hoja_correlativos
+        self._correlativos = []        # Número asignado a cada fila leída de la pestaña, en orden
+        self._ultimo_por_fecha = {}    # 'YYYYMMDD' -> último número asignado en esas filas
+        self._lock_correlativos = threading.Lock()
+
+    def nuevo_estado(self):
+        estado = _nuevo_estado_sync()
+        estado.update({
+            'encabezados': None, # Fila 1 tal como se leyó la última vez
+            'total_filas': 0,    # Número de la última fila con datos (incluye encabezados)
+            'ultima_fila': None, # Valores crudos de la última fila, usados como centinela
+            'proxima_verificacion': 2, # Primera fila del próximo tramo rotativo que se relee
+        })
+        return estado
+
+    def _incorporar_filas(self, estado, values, primera_fila):
+        """Añade al estado las filas crudas `values`, que comienzan en la fila `primera_fila`."""
+        # Se reemplaza el diccionario en vez de modificarlo: las instantáneas ya entregadas
+        # a otras sesiones siguen apuntando al anterior y no deben cambiar
+        if not values:
+            return
+        estado['filas'] = dict(estado['filas'])
+        for i, row in enumerate(values, start=primera_fila):
+            if row:
+                _registrar_id(estado, row[0]) # Incluso filas inválidas: su ID no debe reutilizarse
+            reserva_dict = _fila_a_reserva(estado['encabezados'], row, i)
+            if reserva_dict is not None:
+                _registrar_reserva(estado, i, reserva_dict)
+        estado['total_filas'] = primera_fila + len(values) - 1
+        estado['ultima_fila'] = values[-1]
+
+    def _recarga_completa(self, estado):
+        """
+        Descarga todo el rango A:N y reconstruye el estado desde cero. El estado nuevo se arma
+        aparte y reemplaza al anterior solo si la hoja es válida: si los encabezados no
+        coinciden, `estado` queda como estaba (con sus IDs y filas) y se lanza ValueError.
+        """
+        range_name = f"'{self.hoja}'!A:N" # Asumiendo columnas A a N
+        result = self.planificador.leer(self.servicio.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=range_name
+        ), clave=('get', self.spreadsheet_id, range_name))
+        values = result.get('values', [])
+        nuevo = self.nuevo_estado()
+        nuevo['carga_completa'] = datetime.now()
+        if not values:
+            print("No se encontraron datos en la hoja de cálculo.")
+            estado.update(nuevo)
+            return
+
+        headers = values[0] # La primera fila son los encabezados
+        # Hoja creada antes de alguna de las últimas columnas: se agregan las que faltan
+        anterior = len(COLUMNAS_ANTERIORES) <= len(headers) < len(COLUMNAS_RESERVA)
+        if anterior and headers == COLUMNAS_RESERVA[:len(headers)]:
+            headers = self._agregar_columnas(headers)
+        # Asegurarse de que los encabezados sean los esperados
+        if len(headers) < len(COLUMNAS_ANTERIORES) or headers != COLUMNAS_RESERVA[:len(headers)]:
+            print(f"Error: Encabezados no coinciden. Actuales: {headers}, Esperados: {COLUMNAS_RESERVA}")
+            # Sin datos válidos la caché conserva su instantánea y la interfaz muestra el error
+            raise ValueError(f"La estructura de la hoja '{self.hoja}' no coincide con la esperada. "
+                             f"Encabezados actuales: {headers}, Encabezados esperados: {COLUMNAS_RESERVA}")
+
+        nuevo['encabezados'] = headers
+        nuevo['total_filas'] = 1
+        nuevo['ultima_fila'] = headers
+        self._incorporar_filas(nuevo, values[1:], 2) # Empezar en 2 porque la fila 1 son encabezados
+        estado.update(nuevo) # Mismas claves: cada una se reemplaza, ninguna falta entre medio
+
+    def _agregar_columnas(self, headers):
+        """
+        Hoja anterior a las salas múltiples o a las series: escribe en la fila 1 los encabezados
+        que faltan ('sala' en M, 'serie' en N) y devuelve los encabezados nuevos. Si no se
+        puede, sigue con los anteriores (las columnas que faltan no se leen).
+        """
+        faltantes = COLUMNAS_RESERVA[len(headers):]
+        desde, hasta = COLUMNAS_HOJA[len(headers)], COLUMNAS_HOJA[len(COLUMNAS_RESERVA) - 1]
+        try:
+            self.planificador.escribir(self.servicio.spreadsheets().values().update(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"'{self.hoja}'!{desde}1:{hasta}1",
+                valueInputOption='RAW',
+                body={'values': [faltantes]}
+            ), idempotente=True)
+        except Exception as e:
+            print(f"Advertencia: no se pudieron agregar las columnas {faltantes} a la hoja '{self.hoja}': {e}")
+            return headers
+        print(f"Columnas {faltantes} agregadas a la hoja '{self.hoja}'.")
+        return list(COLUMNAS_RESERVA)
+
+    def _sincronizacion_incremental(self, estado):
+        """
+        Trae solo las filas añadidas después de la marca de agua en una única llamada batchGet.
+        Junto con ellas se releen los encabezados, la última fila conocida, las
+        FILAS_VERIFICADAS_FINALES filas anteriores a ella y un tramo rotativo de
+        FILAS_VERIFICADAS_ROTATIVAS filas más antiguas: si alguno cambió (columnas editadas,
+        una reserva corregida a mano, filas borradas o insertadas más arriba) devuelve False
+        para que el llamador haga una recarga completa.
+        """
+        if estado['encabezados'] is None:
+            return False
+        n = estado['total_filas']
+        rangos = [
+            f"'{self.hoja}'!A1:N1",
+            f"'{self.hoja}'!A{n}:N{n}",
+            f"'{self.hoja}'!A{n + 1}:N",
+        ]
+        # Tramos ya cargados que se comparan con el estado: (primera fila, última fila)
+        finales = (max(2, n - FILAS_VERIFICADAS_FINALES), n - 1)
+        rotativo = (estado['proxima_verificacion'], None)
+        if rotativo[0] >= finales[0]:
+            rotativo = (2, None) # Se recorrió toda la hoja: se vuelve a empezar
+        rotativo = (rotativo[0], min(rotativo[0] + FILAS_VERIFICADAS_ROTATIVAS, finales[0]) - 1)
+        tramos = [tramo for tramo in (finales, rotativo) if tramo[0] <= tramo[1]]
+        rangos += [f"'{self.hoja}'!A{desde}:N{hasta}" for desde, hasta in tramos]
+        result = self.planificador.leer(self.servicio.spreadsheets().values().batchGet(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=rangos
+        ), clave=('batchGet', self.spreadsheet_id, tuple(rangos)))
+        encabezados, centinela, nuevas, *releidas = [vr.get('values', []) for vr in result.get('valueRanges', [])]
+
+        if (encabezados or [None])[0] != estado['encabezados'] or (centinela or [[]])[0] != estado['ultima_fila']:
+            print("La hoja cambió antes de la última fila conocida, se requiere recarga completa.")
+            return False
+        for (desde, hasta), values in zip(tramos, releidas):
+            for i in range(desde, hasta + 1):
+                reserva = estado['filas'].get(i)
+                # Las filas que se saltaron al cargar no tienen con qué compararse
+                row = values[i - desde] if i - desde < len(values) else [] # La API omite las filas vacías del final
+                if reserva is not None and not _fila_coincide(reserva, row, estado['encabezados']):
+                    print(f"La fila {i} de la hoja cambió desde la última carga, se requiere recarga completa.")
+                    return False
+
+        if rotativo in tramos:
+            estado['proxima_verificacion'] = rotativo[1] + 1
+        self._incorporar_filas(estado, nuevas, n + 1)
+        return True
+
+    def escribir_lote(self, estado, reservas, reubicadas=()):
+        """
+        Añade las filas nuevas con un solo values.append: la API las escribe después de la
+        última fila con datos de la hoja, aunque otra instancia (u otra persona) haya agregado
+        filas después de la última sincronización. Si hay reubicaciones, antes escribe en un
+        solo values.batchUpdate el horario (columnas G:H) de cada reserva reubicada, ubicada
+        con el índice id -> fila. La API de valores no permite escribir en una misma llamada
+        rangos fijos y filas que ubica el servidor, así que son dos llamadas: si el append
+        falla, las reubicadas vuelven a su horario anterior (ver _revertir_reubicadas).
+        Devuelve una lista de (num_fila, columna_inicial, valores) con los valores tal como
+        quedaron en la hoja, o None si la respuesta del append no permite saber dónde se
+        escribió.
+        """
+        cambios = []
+        if reubicadas:
+            cambios = self._escribir_reubicadas(estado, reubicadas)
+        if not reservas:
+            return cambios
+
+        # Las reubicaciones van primero: así la reserva nueva nunca queda en la hoja encima
+        # de una reunión que aún no se movió
+        filas_a_insertar = [_reserva_a_fila(reserva) for reserva in reservas]
+        try:
+            respuesta = self.planificador.escribir(self.servicio.spreadsheets().values().append(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"'{self.hoja}'", # Nombre de la hoja sin rango específico para append
+                valueInputOption='USER_ENTERED',
+                includeValuesInResponse=True,
+                body={'values': filas_a_insertar}
+            ), idempotente=False)
+        except Exception as e:
+            if reubicadas:
+                self._revertir_reubicadas(estado, reservas, reubicadas, e)
+            raise
+        actualizacion = respuesta.get('updates', {})
+        coincidencia = re.search(r"![A-Z]+(\d+)", actualizacion.get('updatedRange', ''))
+        if not coincidencia:
+            return None
+        valores = actualizacion.get('updatedData', {}).get('values', filas_a_insertar)
+        primera = int(coincidencia.group(1))
+        return [(primera + k, 0, fila) for k, fila in enumerate(valores)] + cambios
+
+    def _escribir_reubicadas(self, estado, reubicadas):
+        """Escribe el nuevo horario (G:H) de las reubicadas en un solo values.batchUpdate."""
+        escritas = []
+        for reserva_reubicada in reubicadas:
+            num_fila = estado['fila_por_id'].get(reserva_reubicada['id'])
+            if num_fila is None:
+                raise ValueError(f"No se encontró en la hoja la reserva reubicada {reserva_reubicada['id']}")
+            escritas.append((num_fila, 6, [reserva_reubicada['hora_inicio'], reserva_reubicada['hora_fin']]))
+        data = []
+        for num_fila, columna, valores in escritas:
+            desde, hasta = COLUMNAS_HOJA[columna], COLUMNAS_HOJA[columna + len(valores) - 1]
+            data.append({'range': f"'{self.hoja}'!{desde}{num_fila}:{hasta}{num_fila}", 'values': [valores]})
+
+        # Rangos explícitos: repetir la escritura deja el mismo resultado, se puede reintentar
+        respuesta = self.planificador.escribir(self.servicio.spreadsheets().values().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={'valueInputOption': 'USER_ENTERED', 'includeValuesInResponse': True, 'data': data}
+        ), idempotente=True)
+
+        # Valores tal como quedaron en la hoja (si la respuesta no los trae, los enviados)
+        respuestas = respuesta.get('responses', [])
+        cambios = []
+        for k, (num_fila, columna, enviados) in enumerate(escritas):
+            valores = enviados
+            if k < len(respuestas):
+                valores = respuestas[k].get('updatedData', {}).get('values', [enviados])[0]
+            cambios.append((num_fila, columna, valores))
+        return cambios
+
+    def _revertir_reubicadas(self, estado, reservas, reubicadas, error):
+        """
+        El append de `reservas` falló después de mover `reubicadas`: se les vuelve a escribir
+        el horario que tienen en `estado`. Un 4xx (incluido 429) significa que la API no
+        escribió nada; ante un 5xx o un error de red el append pudo haber llegado, así que
+        antes se buscan los IDs en las filas posteriores a la marca de agua y, si están (o no
+        se puede saber), las reubicaciones se dejan como quedaron.
+        """
+        ids = [reserva.get('id') for reserva in reservas]
+        codigo = _estado_http(error)
+        if codigo is None or codigo >= 500:
+            rango = f"'{self.hoja}'!A{estado['total_filas'] + 1}:A"
+            try:
+                result = self.planificador.leer(self.servicio.spreadsheets().values().get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=rango
+                ), clave=('get', self.spreadsheet_id, rango))
+            except Exception as e:
+                print(f"Advertencia: no se pudo verificar si se guardaron las reservas {ids} ({e}); "
+                      f"las reubicaciones quedan escritas.")
+                return
+            if any(fila and fila[0] in ids for fila in result.get('values', [])):
+                return # El append llegó aunque la respuesta no: las reubicaciones son correctas
+        originales = [estado['filas'][estado['fila_por_id'][r['id']]] for r in reubicadas]
+        try:
+            self._escribir_reubicadas(estado, originales)
+        except Exception as e:
+            print(f"Advertencia: no se pudo devolver su horario a las reuniones reubicadas por {ids}: {e}")
+            return
+        print(f"No se guardaron las reservas {ids}; las reuniones reubicadas volvieron a su horario.")
+
+    def aplicar(self, estado, cambios):
+        if cambios is None or estado['encabezados'] is None:
+            return True # Sin rango en la respuesta: resincronizar en la próxima lectura
+        requiere_resync = False
+        estado['filas'] = dict(estado['filas'])
+        for num_fila, columna, valores in cambios:
+            if columna == 0:
+                if num_fila != estado['total_filas'] + 1:
+                    # Otra instancia escribió entre medio: se guarda la fila igual (la clave es el
+                    # número de fila, así que la resincronización no la duplica) y se pide
+                    # traer las filas intermedias en la próxima lectura. La incremental parte
+                    # después de la última fila conocida y no las vería: recarga completa.
+                    requiere_resync = True
+                    estado['carga_completa'] = None
+                if valores:
+                    _registrar_id(estado, valores[0])
+                reserva_dict = _fila_a_reserva(estado['encabezados'], valores, num_fila)
+                if reserva_dict is not None:
+                    _registrar_reserva(estado, num_fila, reserva_dict)
+                if num_fila > estado['total_filas']:
+                    estado['total_filas'] = num_fila
+                    estado['ultima_fila'] = valores
+            else:
+                if num_fila in estado['filas']:
+                    # Copia: la reserva anterior puede estar en instantáneas ya entregadas
+                    reserva = estado['filas'][num_fila].copy()
+                    for k, valor in enumerate(valores):
+                        reserva[estado['encabezados'][columna + k]] = valor
+                    estado['filas'][num_fila] = reserva
+                if num_fila == estado['total_filas'] and estado['ultima_fila'] is not None:
+                    ultima = list(estado['ultima_fila'])
+                    ultima[columna:columna + len(valores)] = valores
+                    estado['ultima_fila'] = ultima
+        return requiere_resync
+
+    def reservar_correlativos(self, fecha_id, cantidad, minimo=0):
+        """
+        Agrega a la pestaña de correlativos una fila ['YYYYMMDD', minimo] por número pedido,
+        con un solo values.append: la API ubica las filas después de la última, así que cada
+        llamada recibe filas propias aunque varios servidores pidan a la vez. El número de
+        cada fila se deduce de las anteriores (el siguiente de su fecha, y mayor que su
+        `minimo`), de modo que todos los servidores calculan lo mismo; se leen solo las filas
+        que este servidor aún no conoce.
+        """
+        filas = [[fecha_id, str(minimo)] for _ in range(cantidad)]
+        try:
+            respuesta = self._agregar_correlativos(filas)
+        except Exception as e:
+            if _estado_http(e) != 400:
+                raise
+            self._crear_hoja_correlativos() # La API responde 400 si la pestaña no existe
+            respuesta = self._agregar_correlativos(filas)
+        coincidencia = re.search(r"![A-Z]+(\d+)", respuesta.get('updates', {}).get('updatedRange', ''))
+        if not coincidencia:
+            raise ValueError(f"La respuesta de la pestaña '{self.hoja_correlativos}' no indica dónde se escribió")
+        primera = int(coincidencia.group(1))
+        ultima = primera + cantidad - 1
+        with self._lock_correlativos:
+            conocidas = len(self._correlativos)
+            if conocidas < ultima:
+                rango = f"'{self.hoja_correlativos}'!A{conocidas + 1}:B{ultima}"
+                values = self.planificador.leer(self.servicio.spreadsheets().values().get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=rango
+                ), clave=('get', self.spreadsheet_id, rango)).get('values', [])
+                for k in range(ultima - conocidas):
+                    fila = values[k] if k < len(values) else []
+                    fecha = fila[0] if fila else ''
+                    try:
+                        piso = int(fila[1])
+                    except (IndexError, ValueError):
+                        piso = 0
+                    numero = max(self._ultimo_por_fecha.get(fecha, 0), piso) + 1
+                    self._ultimo_por_fecha[fecha] = numero
+                    self._correlativos.append(numero)
+            return self._correlativos[primera - 1:ultima]
+
+    def _agregar_correlativos(self, filas):
+        # No idempotente: si una respuesta se pierde, esos números quedan sin usar
+        return self.planificador.escribir(self.servicio.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"'{self.hoja_correlativos}'",
+            valueInputOption='RAW',
+            body={'values': filas}
+        ), idempotente=False)
+
+    def _crear_hoja_correlativos(self):
+        try:
+            self.planificador.escribir(self.servicio.spreadsheets().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={'requests': [{'addSheet': {'properties': {'title': self.hoja_correlativos}}}]}
+            ), idempotente=False)
+        except Exception as e:
+            if _estado_http(e) != 400: # 400: otro servidor la creó entre medio
+                raise
+        else:
+            print(f"Pestaña '{self.hoja_correlativos}' creada para los correlativos de ID.")
+
+COLUMNAS_HOJA = 'ABCDEFGHIJKLMN' # Letra de cada columna de COLUMNAS_RESERVA en la hoja
+
+class AlmacenSQLite(AlmacenReservas):
+    """
+    Reservas en una base SQLite local con índices por fecha, id y criterio. Cada escritura
+    incrementa una revisión global, de modo que la sincronización incremental solo lee las
+    filas con revisión mayor a la última vista. Si se entrega `replica` (un
+    AlmacenGoogleSheets) cada escritura se copia también a la hoja, sin que la hoja
+    participe en las consultas; si la base está vacía se importa desde la réplica.
+    """
+
+    def __init__(self, ruta, replica=None):
+        self.ruta = ruta
+        self.replica = replica
+        self._estado_replica = replica.nuevo_estado() if replica is not None else None
+        with closing(self._conectar()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(f"""
+                CREATE TABLE IF NOT EXISTS reservas (
+                    fila INTEGER PRIMARY KEY AUTOINCREMENT,
+                    {', '.join(f"{c} INTEGER NOT NULL DEFAULT 0" if c == 'num_asistentes'
+                               else f"{c} TEXT NOT NULL DEFAULT ''" for c in COLUMNAS_RESERVA)},
+                    revision INTEGER NOT NULL,
+                    UNIQUE (id)
+                )""")
+            existentes = {columna[1] for columna in con.execute("PRAGMA table_info(reservas)")}
+            for columna in COLUMNAS_RESERVA[len(COLUMNAS_ANTERIORES):]:
+                if columna not in existentes:
+                    # Base anterior a las salas múltiples o a las series: sus reservas quedan en
+                    # la sala principal y sin serie
+                    con.execute(f"ALTER TABLE reservas ADD COLUMN {columna} TEXT NOT NULL DEFAULT ''")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS correlativos (
+                    fecha TEXT PRIMARY KEY,
+                    ultimo INTEGER NOT NULL
+                )""")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_reservas_fecha ON reservas (fecha, hora_inicio)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_reservas_criterio ON reservas (criterio)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_reservas_revision ON reservas (revision)")
+
+    def _conectar(self):
+        # Una conexión por operación: sqlite3 no permite compartirlas entre los hilos de Streamlit
+        return sqlite3.connect(self.ruta, timeout=10)
+
+    def nuevo_estado(self):
+        estado = _nuevo_estado_sync()
+        estado['revision'] = 0 # Mayor revisión incorporada al estado
+        return estado
+
+    def _incorporar_filas(self, estado, filas):
+        if not filas:
+            return
+        estado['filas'] = dict(estado['filas'])
+        for fila in filas:
+            reserva_dict = dict(zip(COLUMNAS_RESERVA, fila[1:-1]))
+            _registrar_reserva(estado, fila[0], reserva_dict)
+            estado['revision'] = max(estado['revision'], fila[-1])
+
+    def _select(self):
+        return f"SELECT fila, {', '.join(COLUMNAS_RESERVA)}, revision FROM reservas"
+
+    def _recarga_completa(self, estado):
+        with closing(self._conectar()) as con:
+            filas = con.execute(self._select() + " ORDER BY fila").fetchall()
+        if not filas and self.replica is not None:
+            filas = self._importar_replica()
+        nuevo = self.nuevo_estado()
+        nuevo['carga_completa'] = datetime.now()
+        self._incorporar_filas(nuevo, filas)
+        estado.update(nuevo) # Mismas claves: cada una se reemplaza, ninguna falta entre medio
+
+    def _sincronizacion_incremental(self, estado):
+        if estado['carga_completa'] is None:
+            return False
+        with closing(self._conectar()) as con:
+            filas = con.execute(self._select() + " WHERE revision > ? ORDER BY fila",
+                                (estado['revision'],)).fetchall()
+        self._incorporar_filas(estado, filas)
+        return True
+
+    def _importar_replica(self):
+        """Primera carga: copia a la base local las reservas que ya existen en la hoja."""
+        self.replica.sincronizar(self._estado_replica)
+        reservas = list(self._estado_replica['filas'].values())
+        print(f"Importando {len(reservas)} reservas desde Google Sheets a {self.ruta}.")
+        with closing(self._conectar()) as con, con:
+            con.executemany(
+                f"INSERT OR IGNORE INTO reservas ({', '.join(COLUMNAS_RESERVA)}, revision) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS_RESERVA))}, 1)",
+                [[r[c] for c in COLUMNAS_RESERVA] for r in reservas])
+            return con.execute(self._select() + " ORDER BY fila").fetchall()
+
+    def escribir_lote(self, estado, reservas, reubicadas=()):
+        """Inserta las reservas y actualiza las reubicadas en una sola transacción."""
+        with closing(self._conectar()) as con, con:
+            con.execute("BEGIN IMMEDIATE")
+            revision = con.execute("SELECT COALESCE(MAX(revision), 0) + 1 FROM reservas").fetchone()[0]
+            filas = []
+            for reserva in reservas:
+                valores = [reserva.get(c, '') for c in COLUMNAS_RESERVA]
+                valores[COLUMNAS_RESERVA.index('num_asistentes')] = int(reserva.get('num_asistentes', 0))
+                filas.append(valores + [revision])
+            con.executemany(
+                f"INSERT INTO reservas ({', '.join(COLUMNAS_RESERVA)}, revision) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS_RESERVA))}, ?)", filas)
+            for reserva_reubicada in reubicadas:
+                con.execute("UPDATE reservas SET hora_inicio = ?, hora_fin = ?, revision = ? WHERE id = ?",
+                            (reserva_reubicada['hora_inicio'], reserva_reubicada['hora_fin'],
+                             revision, reserva_reubicada['id']))
+            cambios = con.execute(
+                self._select() + " WHERE revision = ? ORDER BY fila", (revision,)).fetchall()
+
+        if self.replica is not None:
+            # La hoja es solo un destino de copia: un fallo aquí no invalida la reserva local
+            try:
+                self.replica.sincronizar(self._estado_replica)
+                cambios_replica = self.replica.escribir_lote(self._estado_replica, reservas, reubicadas)
+                self.replica.aplicar(self._estado_replica, cambios_replica)
+            except Exception as e:
+                print(f"Advertencia: no se pudieron replicar las reservas {[r.get('id') for r in reservas]} "
+                      f"en Google Sheets: {e}")
+        return cambios
+
+    def reservar_correlativos(self, fecha_id, cantidad, minimo=0):
+        """
+        Avanza el contador de la fecha en la tabla `correlativos` dentro de una transacción
+        exclusiva. El contador parte del mayor ID ya guardado para la fecha (búsqueda por
+        rango en el índice único de id), así que respeta las reservas anteriores a la tabla.
+        """
+        prefijo = f"RES-{fecha_id}-"
+        with closing(self._conectar()) as con, con:
+            con.execute("BEGIN IMMEDIATE")
+            ultimo = con.execute("SELECT ultimo FROM correlativos WHERE fecha = ?", (fecha_id,)).fetchone()
+            guardado = con.execute(
+                "SELECT MAX(CAST(substr(id, ?) AS INTEGER)) FROM reservas WHERE id >= ? AND id < ?",
+                (len(prefijo) + 1, prefijo, prefijo[:-1] + '.')).fetchone()[0] # '.' sigue a '-'
+            primero = max(ultimo[0] if ultimo else 0, guardado or 0, minimo) + 1
+            con.execute("INSERT OR REPLACE INTO correlativos (fecha, ultimo) VALUES (?, ?)",
+                        (fecha_id, primero + cantidad - 1))
+        return list(range(primero, primero + cantidad))
+
+    def aplicar(self, estado, cambios):
+        # Si otra instancia escribió una revisión intermedia, no se avanza la marca de agua
+        # más allá de ella: la próxima sincronización la trae (las claves no se duplican)
+        requiere_resync = bool(cambios) and cambios[0][-1] != estado['revision'] + 1
+        revision_previa = estado['revision']
+        self._incorporar_filas(estado, cambios)
+        if requiere_resync:
+            estado['revision'] = revision_previa
+        return requiere_resync
+
+    def consultar_rango(self, estado, fecha_desde, fecha_hasta, criterios=None):
+        """Consulta directa a la base usando el índice por fecha (y por criterio si se filtra)."""
+        consulta = self._select() + " WHERE fecha BETWEEN ? AND ?"
+        parametros = [fecha_desde.strftime('%Y-%m-%d'), fecha_hasta.strftime('%Y-%m-%d')]
+        if criterios:
+            consulta += f" AND criterio IN ({', '.join('?' * len(criterios))})"
+            parametros += list(criterios)
+        with closing(self._conectar()) as con:
+            filas = con.execute(consulta + " ORDER BY fecha, hora_inicio", parametros).fetchall()
+        return [Reserva(zip(COLUMNAS_RESERVA, fila[1:-1])) for fila in filas]
+
+# --- Instantánea en disco (Parquet) ---
+# Claves del estado que se reconstruyen a partir de las filas al leer la instantánea
+_CLAVES_INDICES = ('filas', 'fila_por_id', 'max_id_por_fecha')
+
+def guardar_snapshot_reservas(ruta, almacen, filas, marca):
+    """
+    Escribe en `ruta` una tabla Parquet tipada con las reservas (`filas`, clave -> reserva)
+    y, en los metadatos, la marca de agua de sincronización `marca` y el motor de origen.
+    Se escribe a un archivo temporal y luego se reemplaza, para no dejar archivos a medias.
+    """
+    if pa is None:
+        return
+    reservas = list(filas.values())
+    columnas = {'clave': pa.array(list(filas.keys()), type=pa.int64())}
+    for c in COLUMNAS_RESERVA:
+        valores = [r.get(c, '') for r in reservas]
+        if c == 'num_asistentes':
+            columnas[c] = pa.array(valores, type=pa.int32())
+        elif c == 'fecha':
+            # Desde el ordinal ya validado de cada Reserva: una fecha que no se pudo leer
+            # (SQLite no las valida al cargar) queda nula en vez de hacer fallar la instantánea
+            columnas[c] = pa.array([None if r.dia is None else date.fromordinal(r.dia) for r in reservas],
+                                   type=pa.date32())
+        else:
+            columnas[c] = pa.array(valores, type=pa.string())
+    marca = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in marca.items()}
+    tabla = pa.table(columnas).replace_schema_metadata({
+        'motor': type(almacen).__name__,
+        'marca': json.dumps(marca),
+    })
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    pq.write_table(tabla, temporal)
+    os.replace(temporal, ruta)
+
+def cargar_snapshot_reservas(ruta, almacen):
+    """Estado de sincronización leído desde la instantánea, o None si no hay una utilizable."""
+    if pa is None or not os.path.exists(ruta):
+        return None
+    try:
+        tabla = pq.read_table(ruta)
+        metadatos = tabla.schema.metadata or {}
+        if metadatos.get(b'motor', b'').decode() != type(almacen).__name__:
+            return None # Instantánea de otro motor: su marca de agua no sirve aquí
+        marca = json.loads(metadatos[b'marca'])
+        if marca.get('carga_completa'):
+            marca['carga_completa'] = datetime.fromisoformat(marca['carga_completa'])
+        # Conversión por columnas: mucho más rápida que recorrer la tabla fila a fila
+        tabla = tabla.set_column(tabla.schema.get_field_index('fecha'), 'fecha',
+                                 tabla.column('fecha').cast(pa.string()))
+        columnas = {c: tabla.column(c).to_pylist() for c in ['clave'] + COLUMNAS_RESERVA}
+    except Exception as e:
+        print(f"Advertencia: no se pudo leer la instantánea {ruta}: {e}")
+        return None
+
+    estado = almacen.nuevo_estado()
+    estado.update(marca)
+    for k, clave in enumerate(columnas['clave']):
+        reserva = Reserva({c: columnas[c][k] for c in COLUMNAS_RESERVA})
+        if reserva.fecha is None:
+            reserva['fecha'] = ''
+        _registrar_reserva(estado, clave, reserva)
+    return estado
+
+# --- Fin Instantánea en disco ---
@@ -0,0 +1,99 @@
+"""
+Analítica del dashboard: métricas y agregados calculados por columnas con pandas/numpy.
+"""
+from datetime import date
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from .config import DURACION_REUNION_MINUTOS, obtener_hora_local
+from .modelo import SIN_HORA, Reserva
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+HORAS_MAPA_CALOR = list(range(8, 17)) # Filas del mapa de calor: 08:00 a 16:00
+_ORDINAL_EPOCA = date(1970, 1, 1).toordinal() # Reserva.dia - _ORDINAL_EPOCA = días desde 1970-01-01
+
+def tabla_reservas(reservas):
+    """
+    DataFrame tipado con las columnas que usa el dashboard, armado por columnas desde los
+    campos ya calculados de Reserva: dia y dia_semana como enteros, mes como datetime64[M],
+    criterio como categoría. Las reservas sin fecha válida quedan fuera. Acepta también
+    diccionarios (se convierten a Reserva).
+    """
+    if not isinstance(reservas, (list, tuple)) or not all(map(isinstance, reservas, repeat(Reserva))):
+        reservas = [r if isinstance(r, Reserva) else Reserva(r) for r in reservas]
+    n = len(reservas)
+    dia = np.fromiter((-1 if r.dia is None else r.dia for r in reservas), dtype=np.int64, count=n)
+    validas = dia >= 0
+    inicio = np.fromiter((r.inicio for r in reservas), dtype=np.int32, count=n)[validas]
+    fin = np.fromiter((r.fin for r in reservas), dtype=np.int32, count=n)[validas]
+    dia = dia[validas]
+    df = pd.DataFrame({
+        'dia': dia,
+        'dia_semana': ((dia + 6) % 7).astype(np.int8), # El ordinal 1 (0001-01-01) es lunes
+        'mes': (dia - _ORDINAL_EPOCA).astype('datetime64[D]').astype('datetime64[M]'),
+        'inicio': inicio,
+        # Mismo criterio que Reserva.duracion: sin horario válido se cuenta la duración por defecto
+        'duracion': np.where((inicio > SIN_HORA) & (fin > inicio), fin - inicio, DURACION_REUNION_MINUTOS),
+        'num_asistentes': np.fromiter((r.num_asistentes for r in reservas), dtype=np.int64, count=n)[validas],
+        'criterio': pd.Categorical([r.criterio for r, v in zip(reservas, validas) if v]),
+    })
+    return df
+
+def calcular_analitica(reservas, hoy=None):
+    """
+    Todos los agregados del dashboard en una sola pasada vectorizada sobre tabla_reservas:
+    métricas principales, reuniones por día de semana, tendencia mensual, matriz
+    día x hora del mapa de calor y promedio de asistentes por criterio.
+    """
+    if hoy is None:
+        hoy = obtener_hora_local()
+    df = tabla_reservas(reservas)
+    total = len(df)
+
+    # Calcular tasa de ocupación (asumiendo 9 horas x 5 días x 4 semanas)
+    del_mes = (df['mes'].dt.month == hoy.month).to_numpy()
+    total_mes = int(del_mes.sum())
+    horas_totales_mes = 9 * 5 * 4  # 180 horas disponibles
+    horas_reservadas = int(df['duracion'].to_numpy()[del_mes].sum()) / 60
+    tasa_ocupacion = (horas_reservadas / horas_totales_mes) * 100 if horas_totales_mes > 0 else 0
+    promedio_asistentes = float(df['num_asistentes'].mean()) if total else 0
+
+    # Conteos por criterio en orden de aparición (el orden de las porciones del gráfico)
+    por_criterio = df.groupby('criterio', observed=True, sort=False)['num_asistentes']
+    conteo_criterio = por_criterio.size()
+    asistentes_criterio = por_criterio.mean().sort_index(key=lambda c: c.astype(str))
+
+    conteo_dias = np.bincount(df['dia_semana'], minlength=7)[:5]
+    por_mes = df['mes'].value_counts().sort_index()
+
+    hora = df['inicio'].to_numpy() // 60
+    en_mapa = (df['inicio'].to_numpy() != SIN_HORA) & (df['dia_semana'].to_numpy() < 5) & (hora >= 8) & (hora < 17)
+    celdas = df['dia_semana'].to_numpy()[en_mapa] * len(HORAS_MAPA_CALOR) + (hora[en_mapa] - 8)
+    matriz = np.bincount(celdas, minlength=len(DIAS_SEMANA) * len(HORAS_MAPA_CALOR))
+
+    return {
+        'metricas': {
+            'total_reservas': total,
+            'reservas_mes_actual': total_mes,
+            'tasa_ocupacion': round(tasa_ocupacion, 1),
+            'promedio_asistentes': round(promedio_asistentes, 1),
+            'reuniones_por_prioridad': {str(c): int(n) for c, n in conteo_criterio.items()},
+        },
+        'reuniones_por_dia': dict(zip(DIAS_SEMANA, conteo_dias.tolist())),
+        'reuniones_por_mes': {m.strftime('%Y-%m'): int(n) for m, n in por_mes.items()},
+        'mapa_calor': matriz.reshape(len(DIAS_SEMANA), len(HORAS_MAPA_CALOR)).tolist(),
+        'asistentes_por_criterio': {str(c): float(v) for c, v in asistentes_criterio.items()},
+    }
+
+def calcular_metricas(reservas):
+    if not reservas:
+        return {
+            'total_reservas': 0,
+            'reservas_mes_actual': 0,
+            'tasa_ocupacion': 0,
+            'promedio_asistentes': 0,
+            'reuniones_por_prioridad': {}
+        }
+    return calcular_analitica(reservas)['metricas']
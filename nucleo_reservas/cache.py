@@ -0,0 +1,508 @@
+"""
+Caché de reservas compartida entre sesiones, escritura diferida con diario en disco y
+asignación de IDs.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from .agenda import InstantaneaReservas, primer_solape
+from .almacen import (_CLAVES_INDICES, ESTADOS_REINTENTABLES, _estado_http, _separar_id, cargar_snapshot_reservas,
+                      filtrar_reservas, guardar_snapshot_reservas, pa)
+from .modelo import Reserva
+
+# --- Diario de reservas pendientes ---
+ESPERA_MAXIMA_DIARIO = 60 # Segundos máximos entre reintentos de envío al almacén
+MAX_FALLOS_DIARIO = 5 # Fallos propios de una reserva antes de apartarla del envío
+
+class DiarioReservas:
+    """
+    Registro local de reservas confirmadas que aún no llegan al almacén (escritura diferida).
+    Cada reserva se guarda con fsync antes de responder al usuario y se borra cuando el
+    almacén la tiene; el `id` de la reserva es la clave de idempotencia, así que registrar
+    o enviar dos veces la misma reserva no la duplica. Una reserva que falla por sí misma
+    MAX_FALLOS_DIARIO veces (no por cuota, red o el servidor), o con un error que no se
+    arregla reintentando, queda descartada: se conserva en el diario con su último error,
+    pero deja de enviarse.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with closing(self._conectar()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS pendientes (
+                    id TEXT PRIMARY KEY,
+                    reserva TEXT NOT NULL,
+                    reubicadas TEXT NOT NULL,
+                    registrada TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    ultimo_error TEXT NOT NULL DEFAULT '',
+                    fallos INTEGER NOT NULL DEFAULT 0,
+                    descartada INTEGER NOT NULL DEFAULT 0
+                )""")
+            existentes = {columna[1] for columna in con.execute("PRAGMA table_info(pendientes)")}
+            for columna in ('fallos', 'descartada'):
+                if columna not in existentes: # Diario anterior a las reservas descartadas
+                    con.execute(f"ALTER TABLE pendientes ADD COLUMN {columna} INTEGER NOT NULL DEFAULT 0")
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=10)
+        con.execute("PRAGMA synchronous=FULL") # fsync en cada commit: sobrevive a un corte del servidor
+        return con
+
+    def registrar(self, reserva, reubicadas=()):
+        """Guarda la reserva pendiente; devuelve False si ese id ya estaba registrado."""
+        with closing(self._conectar()) as con, con:
+            cursor = con.execute(
+                "INSERT OR IGNORE INTO pendientes (id, reserva, reubicadas, registrada) VALUES (?, ?, ?, ?)",
+                (reserva['id'], json.dumps(dict(reserva)), json.dumps([dict(r) for r in reubicadas]),
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            return cursor.rowcount == 1
+
+    def registrar_lote(self, lote):
+        """Guarda en una sola transacción varias reservas pendientes: [(reserva, reubicadas), ...]."""
+        registrada = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with closing(self._conectar()) as con, con:
+            con.executemany(
+                "INSERT OR IGNORE INTO pendientes (id, reserva, reubicadas, registrada) VALUES (?, ?, ?, ?)",
+                [(reserva['id'], json.dumps(dict(reserva)), json.dumps([dict(r) for r in reubicadas]), registrada)
+                 for reserva, reubicadas in lote])
+
+    def pendientes(self):
+        """Lista de (id, reserva, reubicadas, intentos) en el orden en que se registraron."""
+        with closing(self._conectar()) as con:
+            filas = con.execute(
+                "SELECT id, reserva, reubicadas, intentos FROM pendientes WHERE descartada = 0 ORDER BY rowid"
+            ).fetchall()
+        return [(id_reserva, json.loads(reserva), json.loads(reubicadas), intentos)
+                for id_reserva, reserva, reubicadas, intentos in filas]
+
+    def completar(self, *ids_reserva):
+        with closing(self._conectar()) as con, con:
+            con.executemany("DELETE FROM pendientes WHERE id = ?", [(id_reserva,) for id_reserva in ids_reserva])
+
+    def registrar_fallo(self, id_reserva, error, propio=False, definitivo=False):
+        """
+        Anota un intento fallido. Con `propio` (el error se debe a la reserva) cuenta además
+        como fallo, y al llegar a MAX_FALLOS_DIARIO la reserva se descarta; con `definitivo`
+        se descarta de inmediato. Devuelve True si quedó descartada.
+        """
+        with closing(self._conectar()) as con, con:
+            con.execute("UPDATE pendientes SET intentos = intentos + 1, ultimo_error = ?, fallos = fallos + ?, "
+                        "descartada = (fallos + ? >= ? OR ?) WHERE id = ?",
+                        (str(error), int(propio), int(propio), MAX_FALLOS_DIARIO, int(definitivo), id_reserva))
+            fila = con.execute("SELECT descartada FROM pendientes WHERE id = ?", (id_reserva,)).fetchone()
+        return bool(fila and fila[0])
+
+    def descartadas(self):
+        """Lista de (id, último error) de las reservas que se dejaron de enviar."""
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT id, ultimo_error FROM pendientes WHERE descartada = 1 ORDER BY rowid").fetchall()
+
+# --- Fin Diario de reservas pendientes ---
+
+# --- Caché compartida entre sesiones ---
+TTL_CACHE_RESERVAS = timedelta(seconds=60) # Antigüedad máxima de la instantánea antes de resincronizar
+
+class HorarioOcupado(ValueError):
+    """El horario asignado a una reserva se ocupó mientras se confirmaba: hay que volver a asignarla."""
+
+class IdEnUso(ValueError):
+    """El almacén ya tiene otra reserva con el ID de la que se quiere escribir."""
+
+# Campos que distinguen a una reserva; el horario no, porque una reubicación lo cambia
+_CAMPOS_IDENTIDAD = ('nombre', 'email', 'fecha', 'hora_inicio_rango', 'hora_fin_rango', 'criterio', 'fecha_reserva')
+
+class CacheReservas:
+    """
+    Instantánea de reservas compartida por todas las sesiones del servidor.
+    Las lecturas se sirven desde memoria; el almacén solo se consulta cuando vence el TTL
+    o cuando se invalida la caché, y en ese caso se sincroniza de forma incremental.
+    La instantánea es una tupla que nunca se modifica: cada cambio publica una tupla
+    nueva con un número de versión mayor.
+
+    Con `ruta_snapshot`, después de cada carga se guarda una copia en Parquet con su marca
+    de agua. Al reiniciar el servidor la primera lectura se sirve desde ese archivo y la
+    sincronización incremental corre en segundo plano, así que el primer dashboard no
+    espera la descarga completa del almacén.
+    """
+
+    def __init__(self, almacen, ttl=TTL_CACHE_RESERVAS, ruta_snapshot=None, diario=None):
+        self.almacen = almacen
+        self.ttl = ttl
+        self.ruta_snapshot = ruta_snapshot
+        self.version = 0
+        self._lock = threading.Lock()
+        self._estado = almacen.nuevo_estado()
+        self._snapshot = None
+        self._actualizado = None
+        self._invalidada = False
+        self.ultimo_error = None                 # Error de la última sincronización, si falló
+        self._refrescando = threading.Event()    # Sincronización en segundo plano en curso
+        self._guardando_snapshot = threading.Lock()
+        self.asignador = AsignadorIds(self)
+        # Serializa las escrituras de este servidor: las reubicadas se ubican con el índice
+        # id -> fila, que no debe cambiar entre el cálculo y la llamada
+        self.escritura = threading.Lock()
+        # Escritura diferida: las reservas confirmadas se registran en `diario` y un hilo
+        # las envía al almacén. Mientras tanto se publican en la instantánea desde `_pendientes`.
+        self.diario = diario
+        self._pendientes = {} # id -> (reserva, reubicadas), en orden de registro
+        self._hay_pendientes = threading.Event()
+        # (id, último error) de las reservas del diario que no se pudieron enviar; la interfaz
+        # las muestra como aviso
+        self.descartadas = diario.descartadas() if diario is not None else []
+        if diario is not None:
+            for id_reserva, reserva, reubicadas, _ in diario.pendientes():
+                self._pendientes[id_reserva] = (reserva, reubicadas)
+            if self._pendientes:
+                self._hay_pendientes.set() # Quedaron reservas de una ejecución anterior
+            threading.Thread(target=self._vaciar_diario, daemon=True).start()
+
+    def max_correlativo(self, fecha_id):
+        """Mayor correlativo guardado en el almacén para 'YYYYMMDD' (O(1), sin recorrer reservas)."""
+        if self._snapshot is None:
+            self.obtener()
+        maximo = self._estado['max_id_por_fecha'].get(fecha_id, 0) # Sin candado (ver _refrescar)
+        for id_reserva in list(self._pendientes):
+            partes = _separar_id(id_reserva)
+            if partes and partes[0] == fecha_id:
+                maximo = max(maximo, partes[1])
+        return maximo
+
+    def invalidar(self):
+        """Marca la instantánea como obsoleta; la próxima lectura resincroniza."""
+        self._invalidada = True
+
+    def obtener(self, forzar=False):
+        """Devuelve (versión, reservas). Solo una sesión a la vez refresca la caché."""
+        if self._snapshot is None and self.ruta_snapshot:
+            self._arranque_desde_disco()
+        if self._refrescando.is_set() and not forzar:
+            return self.version, self._snapshot # Se sirve la instantánea mientras se actualiza
+        with self._lock:
+            vencida = self._actualizado is None or datetime.now() - self._actualizado > self.ttl
+            if forzar or vencida or self._invalidada or self._snapshot is None:
+                self._refrescar()
+            return self.version, self._snapshot if self._snapshot is not None else ()
+
+    @property
+    def disponible(self):
+        """True si hay datos cargados al menos una vez (del almacén o de la instantánea en disco)."""
+        return self._snapshot is not None
+
+    def _refrescar(self):
+        # Se sincroniza una copia y se publica con una sola asignación: quien lee self._estado
+        # sin el candado (max_correlativo, consultar_rango) ve el estado anterior o el nuevo,
+        # nunca uno a medio reemplazar
+        estado = dict(self._estado)
+        try:
+            cambio = self.almacen.sincronizar(estado)
+        except Exception as e:
+            # Se mantiene la instantánea anterior (datos viejos pero válidos); se reintentará
+            # en la próxima lectura. La interfaz muestra el aviso a partir de ultimo_error.
+            print(f"Error al cargar reservas desde el almacén: {e}")
+            self.ultimo_error = e
+            self._actualizado = datetime.now() # Próximo intento al vencer el TTL, no en cada rerun
+            return
+        self._estado = estado
+        self.ultimo_error = None
+        if cambio or self._snapshot is None:
+            self._publicar()
+            self._guardar_snapshot()
+        self._actualizado = datetime.now()
+        self._invalidada = False
+
+    def _publicar(self):
+        filas = list(self._estado['filas'].values())
+        if self._pendientes:
+            # Las reservas del diario aún no están en el almacén: se superponen a sus filas
+            posicion = {r.get('id'): i for i, r in enumerate(filas)}
+            for reserva, reubicadas in list(self._pendientes.values()):
+                for r in reubicadas:
+                    if r['id'] in posicion:
+                        i = posicion[r['id']]
+                        filas[i] = filas[i].copy()
+                        filas[i]['hora_inicio'] = r['hora_inicio']
+                        filas[i]['hora_fin'] = r['hora_fin']
+                if reserva['id'] in posicion:
+                    filas[posicion[reserva['id']]] = Reserva(reserva)
+                else:
+                    posicion[reserva['id']] = len(filas)
+                    filas.append(Reserva(reserva))
+        self._snapshot = InstantaneaReservas(filas)
+        self.version += 1
+
+    def _arranque_desde_disco(self):
+        """Publica la instantánea en disco y lanza la sincronización en segundo plano."""
+        with self._lock:
+            if self._snapshot is not None:
+                return
+            estado = cargar_snapshot_reservas(self.ruta_snapshot, self.almacen)
+            if estado is None:
+                return
+            self._estado = estado
+            self._publicar()
+            self._refrescando.set()
+        print(f"Reservas servidas desde la instantánea {self.ruta_snapshot} ({len(self._snapshot)} filas).")
+
+        def sincronizar_en_segundo_plano():
+            try:
+                with self._lock:
+                    self._refrescar()
+            finally:
+                self._refrescando.clear()
+        threading.Thread(target=sincronizar_en_segundo_plano, daemon=True).start()
+
+    def _guardar_snapshot(self):
+        """Guarda en segundo plano la instantánea actual (si ya hay un guardado en curso, se omite)."""
+        if not self.ruta_snapshot or pa is None or not self._guardando_snapshot.acquire(blocking=False):
+            return
+        # Las filas publicadas no se modifican después, así que se pueden leer sin el candado
+        estado = self._estado
+        filas = estado['filas']
+        marca = {k: v for k, v in estado.items() if k not in _CLAVES_INDICES}
+
+        def guardar():
+            try:
+                guardar_snapshot_reservas(self.ruta_snapshot, self.almacen, filas, marca)
+            except Exception as e:
+                print(f"Advertencia: no se pudo guardar la instantánea {self.ruta_snapshot}: {e}")
+            finally:
+                self._guardando_snapshot.release()
+        threading.Thread(target=guardar, daemon=True).start()
+
+    def consultar_rango(self, fecha_desde, fecha_hasta, criterios=None):
+        """Reservas entre dos fechas según el almacén (SQLite consulta su índice por fecha)."""
+        _, reservas = self.obtener()
+        if self._pendientes:
+            return filtrar_reservas(reservas, fecha_desde, fecha_hasta, criterios) # Incluye el diario
+        return self.almacen.consultar_rango(self._estado, fecha_desde, fecha_hasta, criterios)
+
+    def guardar(self, reserva, reubicadas=()):
+        """
+        Guarda la reserva (y los horarios de las reubicadas). Con diario, la registra en disco,
+        la publica en la instantánea y deja el envío al almacén al hilo de escritura diferida;
+        sin diario, la escribe directamente.
+        """
+        self.guardar_lote([(reserva, reubicadas)])
+
+    def guardar_lote(self, lote):
+        """
+        Como `guardar`, para varias reservas nuevas con las reubicadas de cada una:
+        [(reserva, reubicadas), ...]. Se registran juntas en el diario (o se escriben juntas
+        si no hay diario) y llegan al almacén en una sola escritura.
+
+        Dos sesiones pueden asignar con la misma instantánea: antes de guardar se revisan los
+        horarios del lote contra la instantánea vigente (con las reservas recién guardadas por
+        este servidor), con el candado tomado hasta publicarlas, y si alguno ya está ocupado
+        se lanza HorarioOcupado sin guardar nada.
+        """
+        if self._snapshot is None:
+            self.obtener()
+        if self.diario is None:
+            self._escribir_en_almacen(lote, verificar=True)
+            return
+        lote = [(dict(reserva), [dict(r) for r in reubicadas]) for reserva, reubicadas in lote]
+        with self._lock:
+            self._verificar_horarios(lote)
+            self.diario.registrar_lote(lote)
+            for reserva, reubicadas in lote:
+                self._pendientes[reserva['id']] = (reserva, reubicadas)
+            self._publicar()
+        self._hay_pendientes.set()
+
+    def _verificar_horarios(self, lote):
+        solape = primer_solape(self._snapshot or (), lote)
+        if solape is not None:
+            reserva, otra = solape
+            raise HorarioOcupado(
+                f"El horario {reserva['hora_inicio']}-{reserva['hora_fin']} del {reserva['fecha']} en la sala "
+                f"{reserva.get('sala') or 'principal'} se ocupó mientras se confirmaba ({otra['id']}); "
+                f"vuelva a confirmar para buscar otro horario.")
+
+    @property
+    def pendientes_de_envio(self):
+        """Cantidad de reservas registradas en el diario que aún no llegan al almacén."""
+        return len(self._pendientes)
+
+    def _escribir_en_almacen(self, lote, verificar=False):
+        """
+        Escribe en una sola operación las reservas de `lote` ([(reserva, reubicadas), ...]) e
+        incorpora el resultado a la instantánea con lo que devolvió la escritura, sin volver a
+        leer. Las reservas cuyo id ya está en el almacén se omiten junto con sus reubicadas
+        (se escribieron en la misma llamada), siempre que la fila guardada sea la misma
+        reserva; si es otra, se lanza IdEnUso sin escribir nada. Si una reubicada es otra reserva nueva del lote,
+        su nuevo horario va directamente en la fila nueva. Con `verificar`, antes de escribir
+        se revisa que los horarios sigan libres (ver guardar_lote).
+        """
+        ids_lote = {reserva['id'] for reserva, _ in lote}
+        with self.escritura:
+            if any(r['id'] not in self._estado['fila_por_id'] and r['id'] not in ids_lote
+                   for _, reubicadas in lote for r in reubicadas):
+                self.obtener(forzar=True) # Puede ser una fila que aún no se sincronizó
+            if verificar:
+                self._verificar_horarios(lote)
+            nuevas, reubicadas_por_id = {}, {}
+            for reserva, reubicadas in lote:
+                if reserva['id'] in self._estado['fila_por_id']:
+                    guardada = self._estado['filas'][self._estado['fila_por_id'][reserva['id']]]
+                    if any(str(guardada.get(campo, '')) != str(reserva.get(campo, '')) for campo in _CAMPOS_IDENTIDAD):
+                        raise IdEnUso(f"El ID {reserva['id']} ya está en el almacén con otra reserva "
+                                      f"({guardada.get('nombre')}, {guardada.get('fecha')} "
+                                      f"{guardada.get('hora_inicio')}-{guardada.get('hora_fin')}).")
+                    continue # Ya escrita (sus reubicaciones se escriben antes que la fila nueva)
+                nuevas[reserva['id']] = dict(reserva)
+                for r in reubicadas:
+                    if r['id'] in nuevas:
+                        nuevas[r['id']].update(hora_inicio=r['hora_inicio'], hora_fin=r['hora_fin'])
+                    else:
+                        reubicadas_por_id[r['id']] = r # Vale la última reubicación de cada reserva
+            cambios = None
+            if nuevas:
+                cambios = self.almacen.escribir_lote(self._estado, list(nuevas.values()),
+                                                     list(reubicadas_por_id.values()))
+            with self._lock:
+                if nuevas and self.almacen.aplicar(self._estado, cambios):
+                    self._invalidada = True
+                for id_reserva in ids_lote:
+                    self._pendientes.pop(id_reserva, None)
+                self._publicar()
+
+    def _vaciar_diario(self):
+        """
+        Hilo de escritura diferida: envía todas las reservas del diario al almacén en una sola
+        escritura, en el orden en que se registraron (una reserva posterior puede reubicar a
+        una anterior). Ante un error reintenta con espera creciente; una reserva que falla por
+        sí misma MAX_FALLOS_DIARIO veces, o cuyo ID ya usa otra reserva del almacén (IdEnUso),
+        se descarta (ver DiarioReservas) y sale de la instantánea. Antes de reenviar reservas que ya se intentaron, o que quedaron de una
+        ejecución anterior, se resincroniza: la escritura pudo llegar aunque la respuesta no.
+        """
+        verificar = True
+        espera = ESPERA_MAXIMA_DIARIO
+        while True:
+            self._hay_pendientes.wait(timeout=espera)
+            self._hay_pendientes.clear()
+            espera = ESPERA_MAXIMA_DIARIO
+            pendientes = self.diario.pendientes()
+            if not pendientes:
+                verificar = False
+                continue
+            try:
+                if verificar or any(intentos for _, _, _, intentos in pendientes):
+                    self.obtener(forzar=True)
+                    if self.ultimo_error is not None:
+                        raise self.ultimo_error
+            except Exception as e:
+                # No se pudo leer el almacén: el fallo no se debe a ninguna reserva
+                fallidas, propias = [(pendiente, e) for pendiente in pendientes], False
+            else:
+                fallidas, propias = self._enviar_pendientes(pendientes), True
+            for (id_reserva, _, _, intentos), e in fallidas:
+                print(f"No se pudo enviar la reserva {id_reserva} al almacén (intento {intentos + 1}): {e}")
+                if self.diario.registrar_fallo(id_reserva, e, propio=propias and not _error_transitorio(e),
+                                               definitivo=propias and isinstance(e, IdEnUso)):
+                    self._descartar(id_reserva, e)
+            fallidas = [(pendiente, e) for pendiente, e in fallidas if pendiente[0] in self._pendientes]
+            if fallidas:
+                espera = min(ESPERA_MAXIMA_DIARIO, 2 ** min(intentos for (_, _, _, intentos), _ in fallidas))
+            else:
+                verificar = False
+
+    def _enviar_pendientes(self, pendientes):
+        """
+        Envía las reservas del diario en una sola escritura. Si el lote falla por algo que no
+        es cuota, conexión o error del servidor (por ejemplo una reubicada que ya no está en
+        la hoja), se envían una por una en el mismo orden, para que una reserva que no se
+        puede escribir no detenga a las demás. Devuelve [(pendiente, error), ...] con las
+        que no se enviaron.
+        """
+        try:
+            self._escribir_en_almacen([(reserva, reubicadas) for _, reserva, reubicadas, _ in pendientes])
+        except Exception as e:
+            if len(pendientes) == 1 or _error_transitorio(e):
+                return [(pendiente, e) for pendiente in pendientes]
+            print(f"No se pudo enviar el lote de {len(pendientes)} reservas ({e}); se envían una por una.")
+        else:
+            ids = [id_reserva for id_reserva, _, _, _ in pendientes]
+            self.diario.completar(*ids)
+            print(f"Reservas {', '.join(ids)} enviadas al almacén.")
+            return []
+
+        fallidas = []
+        for k, pendiente in enumerate(pendientes):
+            id_reserva, reserva, reubicadas, _ = pendiente
+            try:
+                self._escribir_en_almacen([(reserva, reubicadas)])
+            except Exception as e:
+                fallidas.append((pendiente, e))
+                if _error_transitorio(e):
+                    # El almacén dejó de responder: las siguientes quedan para el próximo intento
+                    fallidas += [(siguiente, e) for siguiente in pendientes[k + 1:]]
+                    break
+                continue
+            self.diario.completar(id_reserva)
+            print(f"Reserva {id_reserva} enviada al almacén.")
+        return fallidas
+
+    def _descartar(self, id_reserva, error):
+        """Saca del envío y de la instantánea una reserva que el diario descartó."""
+        motivo = "" if isinstance(error, IdEnUso) else f" después de {MAX_FALLOS_DIARIO} fallos"
+        print(f"Reserva {id_reserva} descartada{motivo}: {error}")
+        with self._lock:
+            self._pendientes.pop(id_reserva, None)
+            self.descartadas.append((id_reserva, str(error)))
+            self._publicar()
+
+def _error_transitorio(error):
+    """Cuota, error del servidor o de red: no depende de la reserva que se estaba enviando."""
+    estado = _estado_http(error)
+    return (estado in ESTADOS_REINTENTABLES or isinstance(error, sqlite3.OperationalError)
+            or (estado is None and isinstance(error, OSError)))
+
+class AsignadorIds:
+    """
+    Asigna IDs 'RES-YYYYMMDD-NNN' con un contador por fecha guardado en el almacén (la
+    pestaña de correlativos en Sheets, una tabla en SQLite) en vez de recorrer todas las
+    reservas. Protocolo reservar -> confirmar/liberar: `reservar` entrega un correlativo
+    que ningún otro servidor ni sesión volverá a recibir, aunque la fila aún no esté en el
+    almacén; `confirmar` se llama cuando la fila quedó guardada y `liberar` si la reserva
+    se descartó (el número no se reutiliza, solo deja de estar pendiente).
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self.pendientes = set()    # IDs entregados que aún no se confirman
+
+    def reservar(self, fecha_str):
+        return self.reservar_lote(fecha_str, 1)[0]
+
+    def reservar_lote(self, fecha_str, cantidad):
+        """Como `reservar`, pero entrega `cantidad` correlativos seguidos de una sola vez."""
+        fecha_id = fecha_str.replace('-', '')
+        # El mayor que conoce este servidor: IDs guardados antes del contador o aún en el diario
+        guardado = self._cache.max_correlativo(fecha_id)
+        numeros = self._cache.almacen.reservar_correlativos(fecha_id, cantidad, guardado)
+        ids = [f"RES-{fecha_id}-{numero:03d}" for numero in numeros] # Formato 001, 002, etc.
+        with self._lock:
+            self.pendientes.update(ids)
+        return ids
+
+    def confirmar(self, id_reserva):
+        with self._lock:
+            self.pendientes.discard(id_reserva)
+
+    def liberar(self, id_reserva):
+        with self._lock:
+            self.pendientes.discard(id_reserva)
+
+# --- Fin Caché compartida ---
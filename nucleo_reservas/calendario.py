@@ -0,0 +1,166 @@
+"""
+Calendario de días hábiles de Chile y plazos de anticipación de las reservas.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from .config import HORA_FIN_DIA, HORA_INICIO_DIA, ZONA_HORARIA_LOCAL, leer_config, obtener_hora_local
+
+# --- Calendario de días hábiles ---
+# Feriados legales de Chile. Los no recurrentes (elecciones, feriados especiales) se agregan
+# con la opción `feriados`, una lista JSON de fechas AAAA-MM-DD
+ANIOS_CALENDARIO = (2000, 2100) # Años cubiertos por las tablas de CalendarioHabil
+# Día de junio del solsticio de invierno en Santiago (Día de los Pueblos Indígenas, desde 2021)
+SOLSTICIO_INVIERNO = {2021: 21, 2022: 21, 2023: 21, 2024: 20, 2025: 20, 2026: 21, 2027: 21, 2028: 20,
+                      2029: 20, 2030: 21}
+
+def _domingo_de_pascua(anio):
+    """Domingo de Pascua del calendario gregoriano (algoritmo de Meeus/Jones/Butcher)."""
+    a = anio % 19
+    b, c = divmod(anio, 100)
+    d, e = divmod(b, 4)
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(anio, mes, dia + 1)
+
+def _trasladar_a_lunes(fecha):
+    """Ley 19.668: de martes a jueves pasa al lunes de esa semana; el viernes, al lunes siguiente."""
+    if fecha.weekday() in (1, 2, 3):
+        return fecha - timedelta(days=fecha.weekday())
+    if fecha.weekday() == 4:
+        return fecha + timedelta(days=3)
+    return fecha
+
+def feriados_chile(anio):
+    """Feriados legales de Chile del año (los que caen en fin de semana incluidos)."""
+    pascua = _domingo_de_pascua(anio)
+    feriados = {
+        date(anio, 1, 1),                       # Año Nuevo
+        pascua - timedelta(days=2),             # Viernes Santo
+        pascua - timedelta(days=1),             # Sábado Santo
+        date(anio, 5, 1),                       # Día del Trabajo
+        date(anio, 5, 21),                      # Glorias Navales
+        _trasladar_a_lunes(date(anio, 6, 29)),  # San Pedro y San Pablo
+        date(anio, 7, 16),                      # Virgen del Carmen
+        date(anio, 8, 15),                      # Asunción de la Virgen
+        date(anio, 9, 18),                      # Independencia Nacional
+        date(anio, 9, 19),                      # Glorias del Ejército
+        _trasladar_a_lunes(date(anio, 10, 12)), # Encuentro de Dos Mundos
+        date(anio, 11, 1),                      # Todos los Santos
+        date(anio, 12, 8),                      # Inmaculada Concepción
+        date(anio, 12, 25),                     # Navidad
+    }
+    if anio >= 2021:
+        feriados.add(date(anio, 6, SOLSTICIO_INVIERNO.get(anio, 21))) # Pueblos Indígenas
+    if date(anio, 9, 18).weekday() == 1:
+        feriados.add(date(anio, 9, 17)) # Lunes anterior a Fiestas Patrias
+    if anio >= 2017 and date(anio, 9, 19).weekday() == 3:
+        feriados.add(date(anio, 9, 20)) # Viernes posterior a Fiestas Patrias
+    if anio >= 2008:
+        # Iglesias Evangélicas: si cae martes pasa al viernes anterior; si cae miércoles, al siguiente
+        evangelicas = date(anio, 10, 31)
+        feriados.add({1: date(anio, 10, 27), 2: date(anio, 11, 2)}.get(evangelicas.weekday(), evangelicas))
+    return feriados
+
+class CalendarioHabil:
+    """
+    Horas hábiles (jornada de HORA_INICIO_DIA a HORA_FIN_DIA, de lunes a viernes, sin
+    feriados) en tiempo constante. `_acumulado[k]` es el número de días hábiles anteriores
+    al día k del calendario; las horas hábiles desde el origen hasta un momento son
+    jornada * días hábiles previos + lo transcurrido de la jornada de ese día, y las horas
+    entre dos momentos, la diferencia. Acepta datetime o arreglos de numpy (datetime64), en
+    horario local de America/Santiago.
+    """
+
+    def __init__(self, feriados=(), anios=ANIOS_CALENDARIO):
+        self.origen = np.datetime64(date(anios[0], 1, 1), 'D')
+        dias = np.arange(self.origen, np.datetime64(date(anios[1] + 1, 1, 1), 'D'))
+        todos = {f for anio in range(anios[0], anios[1] + 1) for f in feriados_chile(anio)} | set(feriados)
+        self._habil = np.is_busday(dias, holidays=sorted(todos))
+        self._acumulado = np.concatenate(([0], np.cumsum(self._habil)))
+        # Copias como listas para el cálculo de un solo momento (indexar numpy cuesta más)
+        self._habil_lista, self._acumulado_lista = self._habil.tolist(), self._acumulado.tolist()
+        self._primer_ordinal = date(anios[0], 1, 1).toordinal()
+        self.inicio_jornada = (HORA_INICIO_DIA.hour * 60 + HORA_INICIO_DIA.minute) * 60 # Segundos
+        self.segundos_jornada = (HORA_FIN_DIA.hour * 60 + HORA_FIN_DIA.minute) * 60 - self.inicio_jornada
+
+    def _dias(self, fechas):
+        """Índice en las tablas de cada fecha (datetime64[D])."""
+        k = (fechas - self.origen).astype(np.int64)
+        if np.any((k < 0) | (k >= len(self._habil))):
+            raise ValueError(f"Fecha fuera del calendario de días hábiles ({ANIOS_CALENDARIO[0]} a {ANIOS_CALENDARIO[1]})")
+        return k
+
+    def es_habil(self, fechas):
+        return self._habil[self._dias(np.asarray(fechas, dtype='datetime64[D]'))]
+
+    def horas_acumuladas(self, momentos):
+        """Horas hábiles entre el origen del calendario y cada momento."""
+        if isinstance(momentos, datetime):
+            # Un solo momento: sin convertir a arreglos, que para un escalar cuesta más que el cálculo
+            if momentos.tzinfo is not None:
+                momentos = momentos.astimezone(ZONA_HORARIA_LOCAL).replace(tzinfo=None)
+            k = momentos.toordinal() - self._primer_ordinal
+            if not 0 <= k < len(self._habil_lista):
+                raise ValueError(f"Fecha fuera del calendario de días hábiles ({ANIOS_CALENDARIO[0]} a {ANIOS_CALENDARIO[1]})")
+            transcurrido = (momentos - datetime.combine(momentos.date(), time())).total_seconds() - self.inicio_jornada
+            transcurrido = min(max(transcurrido, 0), self.segundos_jornada) if self._habil_lista[k] else 0
+            return (self._acumulado_lista[k] * self.segundos_jornada + transcurrido) / 3600
+        momentos = np.asarray(momentos, dtype='datetime64[us]')
+        fechas = momentos.astype('datetime64[D]')
+        k = self._dias(fechas)
+        transcurrido = np.clip((momentos - fechas).astype(np.int64) / 1e6 - self.inicio_jornada, 0, self.segundos_jornada)
+        return (self._acumulado[k] * self.segundos_jornada + transcurrido * self._habil[k]) / 3600
+
+    def horas_entre(self, inicios, fines):
+        horas = self.horas_acumuladas(fines) - self.horas_acumuladas(inicios)
+        return max(horas, 0) if isinstance(horas, float) else np.maximum(horas, 0)
+
+@lru_cache(maxsize=None)
+def calendario_habil():
+    """Calendario con los feriados legales más los de la opción `feriados`."""
+    feriados = leer_config('feriados', [])
+    if isinstance(feriados, str):
+        feriados = json.loads(feriados)
+    return CalendarioHabil(date.fromisoformat(str(f)) for f in feriados)
+# --- Fin Calendario de días hábiles ---
+
+def es_dia_habil(fecha):
+    return bool(calendario_habil().es_habil(fecha))
+
+def calcular_horas_habiles(fecha_inicio, fecha_fin):
+    """
+    Horas hábiles entre dos momentos, en tiempo constante (ver CalendarioHabil). Con
+    arreglos de datetime64 calcula todas las diferencias de una vez.
+    """
+    return calendario_habil().horas_entre(fecha_inicio, fecha_fin)
+
+def validar_plazo_reserva(fecha_reunion, criterio, fecha_solicitud=None):
+    if fecha_solicitud is None:
+        # Usar la hora local para la validación de plazos
+        fecha_solicitud = obtener_hora_local()
+
+    if fecha_reunion <= fecha_solicitud.date():
+        return False, "La fecha de reunión debe ser futura"
+
+    inicio_habil = datetime.combine(fecha_solicitud.date(), fecha_solicitud.time())
+    fin_habil = datetime.combine(fecha_reunion, time(8, 0))
+    horas_habiles = calcular_horas_habiles(inicio_habil, fin_habil)
+
+    if criterio.startswith("1") or criterio.startswith("2"):
+        if horas_habiles < 24:
+            dias_faltantes = 1 if horas_habiles < 9 else 2
+            return False, f"Reservas de alta prioridad requieren mínimo 24 horas hábiles de anticipación (faltan ~{dias_faltantes} día(s) hábil(es))"
+    else:
+        if horas_habiles < 48:
+            dias_faltantes = 3 if horas_habiles < 27 else 2
+            return False, f"Reservas ordinarias requieren mínimo 48 horas hábiles de anticipación (faltan ~{dias_faltantes} día(s) hábil(es))"
+
+    return True, ""
@@ -0,0 +1,108 @@
+"""
+Configuración del sistema de reservas: zona horaria, criterios de prioridad, jornada,
+duraciones, salas y modo de asignación. Las opciones se leen de las variables de entorno
+RESERVAS_<CLAVE> y de las fuentes que registre la interfaz (secrets.toml en Streamlit).
+"""
+import json
+import os
+from datetime import datetime, time
+from functools import lru_cache
+
+import pytz
+
+# --- Definición de Zona Horaria ---
+# Define la zona horaria de Chile Continental (CLT) o la que corresponda
+# Asegúrate de usar el nombre correcto de la zona horaria, por ejemplo:
+# 'America/Santiago' para Chile Continental
+# 'Pacific/Auckland' para Nueva Zelanda
+# 'Europe/London' para Reino Unido
+ZONA_HORARIA_LOCAL = pytz.timezone('America/Santiago') # <-- Cambia esto si es necesario
+# --- Fin Definición de Zona Horaria ---
+
+# --- Funciones de Utilidad ---
+def obtener_hora_local():
+    """Obtiene la hora actual en la zona horaria local definida."""
+    utc_now = datetime.now(pytz.utc)  # Obtiene la hora UTC actual
+    hora_local = utc_now.astimezone(ZONA_HORARIA_LOCAL) # Convierte a la zona horaria local
+    return hora_local
+
+# --- Fin Funciones de Utilidad ---
+
+# --- Opciones de configuración ---
+_FUENTES_CONFIG = {} # nombre -> función (clave) que devuelve el valor de la opción o None
+
+def agregar_fuente_config(nombre, fuente):
+    """
+    Registra una fuente de opciones que se consulta después de las variables de entorno (la
+    interfaz registra secrets.toml). Registrar otra vez el mismo nombre reemplaza la fuente.
+    """
+    _FUENTES_CONFIG[nombre] = fuente
+
+def leer_config(clave, defecto=None):
+    """Lee una opción de la variable de entorno RESERVAS_<CLAVE> o, si no existe, de las fuentes registradas."""
+    valor = os.environ.get(f"RESERVAS_{clave.upper()}")
+    if valor is not None:
+        return valor
+    for fuente in list(_FUENTES_CONFIG.values()):
+        try:
+            valor = fuente(clave)
+        except Exception: # Fuente no disponible (por ejemplo, sin secrets.toml)
+            continue
+        if valor is not None:
+            return valor
+    return defecto
+# --- Fin Opciones de configuración ---
+
+# Mapeo de criterios a valores numéricos de prioridad
+CRITERIO_PRIORIDAD = {
+    "1 - Supervisión de Referentes": 1,
+    "2 - Reuniones con la Comunidad": 2,
+    "3 - Reuniones de Equipos": 3,
+    "4 - Reuniones Generales (mínimo 4 personas)": 4
+}
+
+HORA_INICIO_DIA = time(8, 0)
+HORA_FIN_DIA = time(17, 0)
+
+# Duración de las reuniones (minutos) y paso entre horarios de inicio ofrecidos; el paso se
+# puede cambiar con la opción `granularidad_minutos` (por ejemplo 5, 10 o 15)
+DURACION_REUNION_MINUTOS = 90
+DURACIONES_REUNION = [30, 45, 60, 90, 120, 180]
+GRANULARIDAD_MINUTOS = 30
+
+# Reubicación de reuniones desplazadas: 'optimo' (búsqueda acotada) o 'voraz' (primer horario
+# libre); opciones `modo_asignacion` y `presupuesto_asignacion_ms`
+MODO_ASIGNACION = 'optimo'
+PRESUPUESTO_ASIGNACION_MS = 200
+
+# Salas y su capacidad (personas). Se reemplaza con la opción `salas`, un JSON como
+# {"Sala Grande": 20, "Sala Chica": 6}; la primera es la sala principal
+SALAS = {"Sala de Reuniones": 20}
+
+@lru_cache(maxsize=None)
+def obtener_salas():
+    """Salas configuradas (nombre -> capacidad), en el orden de la configuración."""
+    salas = leer_config('salas', SALAS)
+    if isinstance(salas, str):
+        salas = json.loads(salas)
+    return {str(nombre): int(capacidad) for nombre, capacidad in dict(salas).items()}
+
+def sala_principal():
+    """Sala a la que pertenecen las reservas sin sala (anteriores a las salas múltiples)."""
+    return next(iter(obtener_salas()))
+
+@lru_cache(maxsize=None)
+def obtener_granularidad():
+    """Paso en minutos entre los horarios de inicio que se ofrecen (opción `granularidad_minutos`)."""
+    return max(1, int(leer_config('granularidad_minutos', GRANULARIDAD_MINUTOS)))
+
+@lru_cache(maxsize=None)
+def obtener_modo_asignacion():
+    """
+    (modo, presupuesto en segundos) para reubicar reuniones: 'optimo' (por defecto) usa
+    asignar_optimo con el presupuesto `presupuesto_asignacion_ms`; 'voraz', el primer
+    horario libre de cada reunión.
+    """
+    modo = str(leer_config('modo_asignacion', MODO_ASIGNACION)).lower()
+    presupuesto = int(leer_config('presupuesto_asignacion_ms', PRESUPUESTO_ASIGNACION_MS)) / 1000
+    return modo, presupuesto
@@ -0,0 +1,258 @@
+"""
+Reservas en lote (CSV o llamadas desde Python) y series de reuniones recurrentes.
+"""
+import calendar
+import itertools
+from datetime import date, timedelta
+
+import pandas as pd
+
+from .agenda import indice_por_fecha, procesar_reserva_con_rango_y_prioridad, salas_candidatas
+from .calendario import validar_plazo_reserva
+from .config import (CRITERIO_PRIORIDAD, DURACION_REUNION_MINUTOS, DURACIONES_REUNION, HORA_FIN_DIA,
+                     HORA_INICIO_DIA, obtener_hora_local, obtener_salas)
+from .modelo import Reserva, minutes_to_time, time_to_minutes
+
+# --- Reservas en lote ---
+COLUMNAS_SOLICITUD = ['nombre', 'email', 'fecha', 'hora_inicio_rango', 'hora_fin_rango', 'criterio',
+                      'num_asistentes', 'proposito'] # Opcionales: 'duracion' (minutos) y 'sala'
+COLUMNAS_INFORME_LOTE = ['solicitud', 'estado', 'id', 'serie', 'fecha', 'sala', 'hora_inicio', 'hora_fin',
+                         'reubicadas', 'detalle']
+
+def leer_solicitudes_csv(archivo):
+    """Solicitudes de un CSV (ruta o archivo subido), una por fila, listas para reservar_en_lote."""
+    tabla = pd.read_csv(archivo, dtype=str, keep_default_na=False)
+    tabla.columns = [columna.strip().lower() for columna in tabla.columns]
+    faltantes = [columna for columna in COLUMNAS_SOLICITUD if columna not in tabla.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+    return tabla.to_dict('records')
+
+def _texto(solicitud, clave):
+    valor = solicitud.get(clave)
+    return '' if valor is None else str(valor).strip()
+
+def _validar_solicitud(solicitud, ahora):
+    """
+    Valida una solicitud del lote con las reglas del formulario. Devuelve (reserva, duración,
+    errores); la reserva es None si hubo errores.
+    """
+    errores = []
+    nombre, email, proposito = (_texto(solicitud, campo) for campo in ('nombre', 'email', 'proposito'))
+    if not nombre:
+        errores.append("El nombre es obligatorio")
+    if not email or "@" not in email:
+        errores.append("El correo electrónico es inválido")
+    if not proposito:
+        errores.append("El propósito de la reunión es obligatorio")
+
+    # Se acepta el texto completo del criterio o solo su número
+    criterio = _texto(solicitud, 'criterio')
+    criterio = next((c for c, prioridad in CRITERIO_PRIORIDAD.items() if criterio in (c, str(prioridad))), '')
+    if not criterio:
+        errores.append("Criterio de prioridad no reconocido")
+
+    try:
+        fecha = date.fromisoformat(_texto(solicitud, 'fecha'))
+    except ValueError:
+        fecha = None
+        errores.append("Fecha inválida (formato AAAA-MM-DD)")
+
+    try:
+        inicio_rango = time_to_minutes(_texto(solicitud, 'hora_inicio_rango')[:5])
+        fin_rango = time_to_minutes(_texto(solicitud, 'hora_fin_rango')[:5])
+    except ValueError:
+        errores.append("Rango horario inválido (formato HH:MM)")
+    else:
+        if fin_rango <= inicio_rango:
+            errores.append("La hora de fin debe ser posterior a la hora de inicio")
+        elif inicio_rango < time_to_minutes(HORA_INICIO_DIA) or fin_rango > time_to_minutes(HORA_FIN_DIA):
+            errores.append(f"El rango horario debe estar entre {HORA_INICIO_DIA.strftime('%H:%M')} y {HORA_FIN_DIA.strftime('%H:%M')}")
+
+    try:
+        num_asistentes = int(_texto(solicitud, 'num_asistentes'))
+    except ValueError:
+        num_asistentes = 0
+    sala = _texto(solicitud, 'sala')
+    if num_asistentes < 1:
+        errores.append("El número de asistentes es inválido")
+    elif criterio.startswith("4") and num_asistentes < 4:
+        errores.append("Las reuniones generales deben tener mínimo 4 personas")
+    if sala and sala not in obtener_salas():
+        errores.append(f"La sala {sala} no existe")
+    elif num_asistentes >= 1 and not salas_candidatas(num_asistentes, sala):
+        errores.append(f"No hay sala con capacidad para {num_asistentes} personas")
+
+    duracion = _texto(solicitud, 'duracion')
+    duracion = int(duracion) if duracion.isdigit() else DURACION_REUNION_MINUTOS if not duracion else None
+    if duracion not in DURACIONES_REUNION:
+        errores.append(f"Duración no permitida (minutos: {', '.join(map(str, DURACIONES_REUNION))})")
+
+    if fecha and criterio:
+        plazo_valido, mensaje_plazo = validar_plazo_reserva(fecha, criterio, ahora)
+        if not plazo_valido:
+            errores.append(mensaje_plazo)
+
+    if errores:
+        return None, duracion, errores
+    return Reserva({
+        "nombre": nombre,
+        "email": email,
+        "fecha": fecha.isoformat(),
+        "hora_inicio_rango": minutes_to_time(inicio_rango),
+        "hora_fin_rango": minutes_to_time(fin_rango),
+        "hora_inicio": "",
+        "hora_fin": "",
+        "criterio": criterio,
+        "num_asistentes": num_asistentes,
+        "proposito": proposito,
+        "fecha_reserva": ahora.strftime('%Y-%m-%d %H:%M:%S'),
+        "sala": sala
+    }), duracion, []
+
+def reservar_en_lote(cache, solicitudes, modo=None, serie=False, completa=False):
+    """
+    Reserva de una vez en `cache` (CacheReservas) una lista de solicitudes (diccionarios con
+    COLUMNAS_SOLICITUD, p. ej. de leer_solicitudes_csv). Lee las reservas una sola vez y asigna las solicitudes válidas
+    por prioridad (luego fecha y orden de entrada) sobre una agenda en memoria de cada día,
+    de modo que cada una ve a las anteriores del lote; al final reserva los IDs de cada fecha
+    en bloque y guarda todo, con los horarios de las reuniones reubicadas, en una sola
+    escritura. Con `serie`, las reservas guardadas comparten como `serie` el ID de la primera;
+    con `completa`, no se guarda nada si alguna solicitud no se pudo reservar. Devuelve un
+    DataFrame (COLUMNAS_INFORME_LOTE) con el resultado de cada solicitud, en el orden de entrada.
+    """
+    _, reservas = cache.obtener(forzar=True)
+    ahora = obtener_hora_local()
+    informe = [{'solicitud': i + 1, 'estado': 'rechazada', 'id': '', 'serie': '', 'fecha': _texto(solicitud, 'fecha'),
+                'sala': '', 'hora_inicio': '', 'hora_fin': '', 'reubicadas': 0, 'detalle': ''}
+               for i, solicitud in enumerate(solicitudes)]
+    # Sin datos válidos los días parecerían libres y se asignarían horarios e IDs repetidos
+    if not cache.disponible:
+        for fila in informe:
+            fila.update(estado='error', detalle="No hay datos de reservas disponibles; intente nuevamente en unos minutos")
+        return pd.DataFrame(informe, columns=COLUMNAS_INFORME_LOTE)
+
+    validas = []
+    for i, solicitud in enumerate(solicitudes):
+        reserva, duracion, errores = _validar_solicitud(solicitud, ahora)
+        if errores:
+            informe[i]['detalle'] = "; ".join(errores)
+            continue
+        reserva['id'] = f"LOTE-{i}" # Provisorio: los IDs definitivos se reservan al final
+        validas.append((i, reserva, duracion))
+    validas.sort(key=lambda valida: (valida[1].prioridad, valida[1].dia, valida[0]))
+
+    indice = indice_por_fecha(reservas)
+    agendas = {}    # fecha -> reservas del día con las del lote ya asignadas
+    originales = {} # id -> (hora_inicio, hora_fin) guardados de las reservas de los días del lote
+    movida_por = {} # id de una reserva guardada -> última solicitud que la reubicó
+    asignadas = []
+    for i, reserva, duracion in validas:
+        fecha = reserva['fecha']
+        if fecha not in agendas:
+            agendas[fecha] = indice.reservas_del_dia(fecha)
+            originales.update((r['id'], (r['hora_inicio'], r['hora_fin'])) for r in agendas[fecha])
+        avisos = []
+        exito, agendas[fecha], _, reubicadas = procesar_reserva_con_rango_y_prioridad(
+            reserva, agendas[fecha], duracion, modo, avisos
+        )
+        if not exito:
+            informe[i].update(estado='sin horario',
+                              detalle="No hay disponibilidad en el rango ni reubicando reuniones de menor prioridad")
+            continue
+        asignadas.append(i)
+        informe[i].update(reubicadas=len(reubicadas), detalle="; ".join(avisos))
+        for r in reubicadas:
+            if r['id'] in originales:
+                movida_por[r['id']] = i
+    if not asignadas:
+        return pd.DataFrame(informe, columns=COLUMNAS_INFORME_LOTE)
+    if completa and len(asignadas) < len(solicitudes):
+        for i in asignadas:
+            informe[i].update(estado='no guardada', detalle="No se guardó: hay solicitudes que no se pudieron reservar")
+        return pd.DataFrame(informe, columns=COLUMNAS_INFORME_LOTE)
+
+    # La reubicación trabaja sobre copias: el horario final de cada reserva está en la agenda
+    finales = {r['id']: r for agenda in agendas.values() for r in agenda}
+    asignadas.sort()
+    por_fecha = {}
+    for i in asignadas:
+        por_fecha.setdefault(finales[f"LOTE-{i}"]['fecha'], []).append(i)
+    ids = {}
+    for fecha, indices in por_fecha.items():
+        ids.update(zip(indices, cache.asignador.reservar_lote(fecha, len(indices))))
+    reubicadas_por_solicitud = {i: [] for i in asignadas}
+    for id_reserva, i in movida_por.items():
+        reserva = finales[id_reserva]
+        if (reserva['hora_inicio'], reserva['hora_fin']) != originales[id_reserva]:
+            reubicadas_por_solicitud[i].append(reserva)
+    lote = []
+    for i in asignadas:
+        reserva = finales[f"LOTE-{i}"]
+        reserva['id'] = ids[i]
+        if serie:
+            reserva['serie'] = ids[asignadas[0]]
+        lote.append((reserva, reubicadas_por_solicitud[i]))
+
+    try:
+        cache.guardar_lote(lote)
+    except Exception as e:
+        print(f"Error al guardar el lote de reservas: {e}")
+        for i in asignadas:
+            cache.asignador.liberar(ids[i])
+            informe[i].update(estado='error', detalle=f"Error al guardar la reserva: {e}")
+        return pd.DataFrame(informe, columns=COLUMNAS_INFORME_LOTE)
+    for i, (reserva, _) in zip(asignadas, lote):
+        cache.asignador.confirmar(reserva['id'])
+        informe[i].update(estado='reservada', id=reserva['id'], serie=reserva['serie'], sala=reserva['sala'],
+                          hora_inicio=reserva['hora_inicio'], hora_fin=reserva['hora_fin'])
+    print(f"Lote de reservas: {len(asignadas)} de {len(solicitudes)} solicitudes guardadas.")
+    return pd.DataFrame(informe, columns=COLUMNAS_INFORME_LOTE)
+# --- Fin Reservas en lote ---
+
+# --- Reservas recurrentes ---
+FRECUENCIAS_RECURRENCIA = {'semanal': "Cada semana", 'quincenal': "Cada dos semanas", 'mensual': "Cada mes"}
+MAXIMO_OCURRENCIAS_SERIE = 60
+
+def expandir_recurrencia(desde, hasta, frecuencia, excepciones=()):
+    """
+    Fechas de una serie entre `desde` y `hasta` (inclusive), generadas a medida que se piden:
+    cada 7 o 14 días, o el mismo día de cada mes (se saltan los meses que no lo tienen, como
+    el 31 en abril). Se omiten las fechas de `excepciones`.
+    """
+    dias = {'semanal': 7, 'quincenal': 14}.get(frecuencia)
+    if dias is None and frecuencia != 'mensual':
+        raise ValueError(f"Frecuencia desconocida: {frecuencia}")
+    excepciones = set(excepciones)
+    for k in itertools.count():
+        if dias:
+            fecha = desde + timedelta(days=k * dias)
+        else:
+            anios, mes = divmod(desde.month - 1 + k, 12)
+            fecha = date(desde.year + anios, mes + 1, 1)
+            if fecha > hasta:
+                return
+            if desde.day > calendar.monthrange(fecha.year, fecha.month)[1]:
+                continue
+            fecha = fecha.replace(day=desde.day)
+        if fecha > hasta:
+            return
+        if fecha not in excepciones:
+            yield fecha
+
+def reservar_serie(cache, solicitud, hasta, frecuencia, excepciones=(), modo=None, completa=True):
+    """
+    Reserva una serie recurrente: `solicitud` (como las de reservar_en_lote; su fecha es la
+    primera ocurrencia) se repite con `frecuencia` hasta `hasta`, salvo en `excepciones`.
+    Las ocurrencias se asignan juntas con reservar_en_lote (una lectura, la agenda de cada
+    día en memoria) y se guardan en una sola escritura con el mismo `serie`. Con `completa`
+    no se guarda nada si alguna fecha no tiene horario. Devuelve el informe por ocurrencia.
+    """
+    desde = date.fromisoformat(_texto(solicitud, 'fecha'))
+    fechas = list(itertools.islice(expandir_recurrencia(desde, hasta, frecuencia, excepciones),
+                                   MAXIMO_OCURRENCIAS_SERIE + 1))
+    if len(fechas) > MAXIMO_OCURRENCIAS_SERIE:
+        raise ValueError(f"La serie supera el máximo de {MAXIMO_OCURRENCIAS_SERIE} reuniones")
+    solicitudes = [dict(solicitud, fecha=fecha.isoformat()) for fecha in fechas]
+    return reservar_en_lote(cache, solicitudes, modo, serie=True, completa=completa)
+# --- Fin Reservas recurrentes ---
@@ -0,0 +1,154 @@
+"""
+Modelo de datos: columnas de una reserva, la clase Reserva y conversiones de horas.
+"""
+import collections.abc
+from datetime import date, datetime
+
+from .config import CRITERIO_PRIORIDAD, DURACION_REUNION_MINUTOS
+
+COLUMNAS_RESERVA = ['id', 'nombre', 'email', 'fecha', 'hora_inicio_rango', 'hora_fin_rango',
+                    'hora_inicio', 'hora_fin', 'criterio', 'num_asistentes', 'proposito', 'fecha_reserva',
+                    'sala', 'serie']
+COLUMNAS_ANTERIORES = COLUMNAS_RESERVA[:12] # Hojas y bases creadas antes de las columnas 'sala' y 'serie'
+
+SIN_HORA = -1 # Minutos de una hora vacía o inválida: no se solapa con ningún horario
+
+def _minutos(hora_str):
+    """'HH:MM' -> minutos desde medianoche, sin pasar por strptime; SIN_HORA si no es válida."""
+    try:
+        horas, minutos = hora_str.split(':')
+        return int(horas) * 60 + int(minutos)
+    except (AttributeError, ValueError):
+        return SIN_HORA
+
+def _ordinal_fecha(fecha_str):
+    """'YYYY-MM-DD' -> ordinal de la fecha (date.toordinal); None si no es válida."""
+    try:
+        return date.fromisoformat(fecha_str).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+class Reserva:
+    """
+    Reserva con los campos de la hoja (COLUMNAS_RESERVA) más, calculados una sola vez al ingresar,
+    `dia` (ordinal de la fecha o None), `inicio`/`fin` (minutos desde medianoche) y
+    `prioridad` (1 a 4, 999 si el criterio no se reconoce). Usa __slots__ en vez de un
+    diccionario por reserva. Se lee y modifica como diccionario (r['fecha'], r.get(...),
+    dict(r)), de modo que el código de la interfaz y de los almacenes no cambia; al
+    asignar la fecha, las horas o el criterio se recalculan los campos enteros.
+    """
+
+    __slots__ = tuple(COLUMNAS_RESERVA) + ('dia', 'inicio', 'fin', 'prioridad')
+
+    def __init__(self, datos=()):
+        if isinstance(datos, Reserva):
+            for campo in Reserva.__slots__:
+                setattr(self, campo, getattr(datos, campo))
+            return
+        if not hasattr(datos, 'get'):
+            datos = dict(datos)
+        for columna in COLUMNAS_RESERVA:
+            setattr(self, columna, datos.get(columna, ''))
+        if self.num_asistentes == '':
+            self.num_asistentes = 0
+        self.dia = _ordinal_fecha(self.fecha)
+        self.inicio = _minutos(self.hora_inicio)
+        self.fin = _minutos(self.hora_fin)
+        self.prioridad = CRITERIO_PRIORIDAD.get(self.criterio, 999)
+
+    def __getitem__(self, clave):
+        if clave not in _CAMPOS_RESERVA:
+            raise KeyError(clave)
+        return getattr(self, clave)
+
+    def __setitem__(self, clave, valor):
+        if clave not in _CAMPOS_RESERVA:
+            raise KeyError(clave)
+        setattr(self, clave, valor)
+        if clave == 'fecha':
+            self.dia = _ordinal_fecha(valor)
+        elif clave == 'hora_inicio':
+            self.inicio = _minutos(valor)
+        elif clave == 'hora_fin':
+            self.fin = _minutos(valor)
+        elif clave == 'criterio':
+            self.prioridad = CRITERIO_PRIORIDAD.get(valor, 999)
+
+    def __contains__(self, clave):
+        return clave in _CAMPOS_RESERVA
+
+    def __iter__(self):
+        return iter(COLUMNAS_RESERVA)
+
+    def __len__(self):
+        return len(COLUMNAS_RESERVA)
+
+    def __eq__(self, otra):
+        if isinstance(otra, Reserva):
+            return all(getattr(self, c) == getattr(otra, c) for c in COLUMNAS_RESERVA)
+        if isinstance(otra, dict):
+            return dict(self) == otra
+        return NotImplemented
+
+    __hash__ = None # Mutable, como el diccionario al que reemplaza
+
+    def get(self, clave, defecto=None):
+        return getattr(self, clave) if clave in _CAMPOS_RESERVA else defecto
+
+    def keys(self):
+        return list(COLUMNAS_RESERVA)
+
+    def items(self):
+        return [(c, getattr(self, c)) for c in COLUMNAS_RESERVA]
+
+    def copy(self):
+        return Reserva(self)
+
+    @property
+    def duracion(self):
+        """Minutos entre hora_inicio y hora_fin; DURACION_REUNION_MINUTOS si aún no tiene horario."""
+        if SIN_HORA < self.inicio < self.fin:
+            return self.fin - self.inicio
+        return DURACION_REUNION_MINUTOS
+
+    def __repr__(self):
+        return f"Reserva({dict(self)!r})"
+
+_CAMPOS_RESERVA = frozenset(COLUMNAS_RESERVA)
+# Registrada como Mapping para que pandas (pd.DataFrame(reservas)) la trate como un diccionario
+collections.abc.Mapping.register(Reserva)
+
+def _intervalo(reserva):
+    """(inicio, fin) en minutos de una Reserva o de un diccionario de reserva."""
+    if isinstance(reserva, Reserva):
+        return reserva.inicio, reserva.fin
+    return _minutos(reserva.get('hora_inicio', '')), _minutos(reserva.get('hora_fin', ''))
+
+def obtener_prioridad(criterio):
+    return CRITERIO_PRIORIDAD.get(criterio, 999)
+
+def time_to_minutes(t):
+    if isinstance(t, int): # Ya en minutos (Reserva.inicio / Reserva.fin)
+        return t
+    if isinstance(t, str):
+        t = datetime.strptime(t, '%H:%M').time()
+    return t.hour * 60 + t.minute
+
+def minutes_to_time(minutes):
+    hours = minutes // 60
+    mins = minutes % 60
+    return f"{hours:02d}:{mins:02d}"
+
+def verificar_solapamiento(inicio1, fin1, inicio2, fin2):
+    i1 = time_to_minutes(inicio1)
+    f1 = time_to_minutes(fin1)
+    i2 = time_to_minutes(inicio2)
+    f2 = time_to_minutes(fin2)
+    return not (f1 <= i2 or f2 <= i1)
+
+def formatear_duracion(minutos):
+    """90 -> '1 h 30 min'."""
+    horas, resto = divmod(minutos, 60)
+    if not horas:
+        return f"{resto} min"
+    return f"{horas} h {resto} min" if resto else f"{horas} h"